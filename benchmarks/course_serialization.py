@@ -0,0 +1,92 @@
+"""
+Per-course cost of turning a course listing into a response body.
+
+  before - ORM CourseRow objects with loaded teachers -> Course.from_attributes (validated),
+           then what FastAPI does with response_model: validate the page again, dump it in
+           JSON mode and render it with JSONResponse
+  after  - column mappings as returned by SELECT ... RETURNING -> Course.from_row
+           (model_construct), then ORJSONResponse(page.model_dump())
+
+Only the Python side is measured; no database is needed. Building the ORM objects is not counted
+in "before", so the real gap is larger by the identity-map hydration that from_row also avoids.
+
+    python -m benchmarks.course_serialization --courses 10000 --repeat 5
+"""
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from src.database.models import models
+from src.schemas import courses_dto
+
+
+def _row(i: int) -> dict:
+    start = date(2026, 9, 1) + timedelta(days=i % 60)
+    return {
+        "id": i + 1,
+        "name": f"Курс {i}",
+        "description": "Описание курса " * 10,
+        "banner_url": f"banners/{i:064x}.png",
+        "banner_renditions": {"thumb": f"banners/{i:064x}_thumb.webp"},
+        "schedule": {"monday": "18:00-19:30", "thursday": "18:00-19:30"},
+        "is_from_misis": i % 2 == 0,
+        "start_date": start,
+        "end_date": start + timedelta(days=90),
+        "points_per_visit": 1.5,
+        "capacity": 30,
+        "enrolled_count": i % 30,
+        "rating_count": i % 7,
+        "rating_sum": 4.5 * (i % 7),
+        "version": 1,
+        "teachers": [1, 2],
+    }
+
+
+def _orm_course(row: dict) -> models.CourseRow:
+    columns = {key: value for key, value in row.items() if key != "teachers"}
+    return models.CourseRow(**columns, teachers=[models.UserRow(id=teacher_id) for teacher_id in row["teachers"]])
+
+
+def _before(orm_courses, page_adapter: TypeAdapter) -> bytes:
+    items = [courses_dto.Course.from_attributes(course) for course in orm_courses]
+    page = courses_dto.CoursePage(items=items, next_after=None)
+    content = page_adapter.dump_python(page_adapter.validate_python(page), mode="json")
+    return JSONResponse(content).body
+
+
+def _after(rows) -> bytes:
+    items = [courses_dto.Course.from_row(row) for row in rows]
+    page = courses_dto.CoursePage(items=items, next_after=None)
+    return ORJSONResponse(page.model_dump()).body
+
+
+def _measure(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(args) -> None:
+    rows = [_row(i) for i in range(args.courses)]
+    orm_courses = [_orm_course(row) for row in rows]
+    page_adapter = TypeAdapter(courses_dto.CoursePage)
+
+    before = _measure(lambda: _before(orm_courses, page_adapter), args.repeat)
+    after = _measure(lambda: _after(rows), args.repeat)
+    for name, seconds in (("before", before), ("after", after)):
+        print(f"{name:<7} {seconds * 1000:9.1f} ms total  {seconds / args.courses * 1e6:7.2f} us/course")
+    print(f"speedup {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=10000, help="courses in the listing")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per path, the median is reported")
+    main(parser.parse_args())
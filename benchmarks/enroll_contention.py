@@ -0,0 +1,142 @@
+"""
+Throughput of POST /enroll's query under a registration rush.
+
+Runs db_register_user_on_course from many concurrent sessions against the database configured
+through DB_* (env or .env) and prints enrollments per second and latency percentiles for:
+
+  hot     - every enroller hits one course with capacity for half of them
+  full    - one course that is already full, every enrollment goes to the waitlist
+  spread  - enrollers spread over many courses, no contention on a course row
+  global  - like hot, but each transaction first takes one global lock, for comparison
+
+hot and full staying close to spread, and well above global, shows that enrolling only locks the
+course's own row and only while seats remain. Everything the benchmark creates is deleted at the end.
+
+    python -m benchmarks.enroll_contention --enrollers 500 --connections 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database import courses
+from src.database.database import DATABASE_URL
+from src.database.models import models
+from src.schemas import enrollment_dto
+
+SCENARIOS = ("hot", "full", "spread", "global")
+
+
+async def _create_users(session_factory, count: int, tag: str) -> list:
+    async with session_factory() as session:
+        result = await session.execute(
+            insert(models.UserRow)
+            .values([{"email": f"bench-{tag}-{i}@example.com", "role": "user"} for i in range(count)])
+            .returning(models.UserRow.id)
+        )
+        user_ids = list(result.scalars())
+        await session.commit()
+    return user_ids
+
+
+async def _create_courses(session_factory, count: int, capacity, tag: str) -> list:
+    today = date.today()
+    async with session_factory() as session:
+        result = await session.execute(
+            insert(models.CourseRow)
+            .values([
+                {
+                    "name": f"bench-{tag}-{i}",
+                    "start_date": today,
+                    "end_date": today + timedelta(days=30),
+                    "points_per_visit": 1,
+                    "capacity": capacity,
+                }
+                for i in range(count)
+            ])
+            .returning(models.CourseRow.id)
+        )
+        course_ids = list(result.scalars())
+        await session.commit()
+    return course_ids
+
+
+async def _enroll(session_factory, user_id: int, course_id: int, global_lock: bool) -> float:
+    started = time.perf_counter()
+    async with session_factory() as session:
+        if global_lock:
+            await session.execute(select(func.pg_advisory_xact_lock(0)))
+        await courses.db_register_user_on_course(
+            session, enrollment_dto.EnrollmentCreate(course_id=course_id, user_id=user_id)
+        )
+        await session.commit()
+    return time.perf_counter() - started
+
+
+async def _run(session_factory, scenario: str, user_ids: list, tag: str, spread_courses: int) -> None:
+    if scenario == "spread":
+        course_ids = await _create_courses(session_factory, spread_courses, None, tag)
+    else:
+        capacity = 0 if scenario == "full" else len(user_ids) // 2
+        course_ids = await _create_courses(session_factory, 1, capacity, tag)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(
+        _enroll(session_factory, user_id, course_ids[i % len(course_ids)], scenario == "global")
+        for i, user_id in enumerate(user_ids)
+    ))
+    elapsed = time.perf_counter() - started
+
+    async with session_factory() as session:
+        enrolled_count = await session.scalar(
+            select(func.sum(models.CourseRow.enrolled_count)).where(models.CourseRow.id.in_(course_ids))
+        )
+        registered = await session.scalar(
+            select(func.count())
+            .select_from(models.EnrollmentRow)
+            .where(
+                models.EnrollmentRow.course_id.in_(course_ids),
+                models.EnrollmentRow.status == enrollment_dto.EnrollmentStatus.registered.value
+            )
+        )
+        await session.execute(delete(models.CourseRow).where(models.CourseRow.id.in_(course_ids)))
+        await session.commit()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{scenario:<7} {len(user_ids) / elapsed:10.1f} enroll/s"
+        f"  p50 {statistics.median(latencies) * 1000:7.1f} ms"
+        f"  p99 {p99 * 1000:7.1f} ms"
+        f"  registered {registered} (enrolled_count {enrolled_count})"
+    )
+    assert enrolled_count == registered, "enrolled_count drifted from registered enrollments"
+
+
+async def main(args) -> None:
+    engine = create_async_engine(DATABASE_URL, pool_size=args.connections, max_overflow=0)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    tag = uuid.uuid4().hex[:8]
+    user_ids = await _create_users(session_factory, args.enrollers, tag)
+    try:
+        for scenario in args.scenarios:
+            await _run(session_factory, scenario, user_ids, f"{tag}-{scenario}", args.spread_courses)
+    finally:
+        async with session_factory() as session:
+            await session.execute(delete(models.UserRow).where(models.UserRow.id.in_(user_ids)))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enrollers", type=int, default=500, help="concurrent enrollments per scenario")
+    parser.add_argument("--connections", type=int, default=50, help="connections in the benchmark's pool")
+    parser.add_argument("--spread-courses", type=int, default=100, help="courses used by the spread scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    asyncio.run(main(parser.parse_args()))
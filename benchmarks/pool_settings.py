@@ -0,0 +1,116 @@
+"""
+Catalog read throughput across engine and pool settings.
+
+Each setting is POOL_SIZE:MAX_OVERFLOW:PREPARED_STATEMENT_CACHE_SIZE. For every setting the
+benchmark opens a fresh engine against the database configured through DB_* (env or .env), keeps
+--clients coroutines reading catalog pages (db_get_courses_page, the GET /courses query) for
+--duration seconds and prints requests per second, latency percentiles, the longest wait for a
+pooled connection and the peak number of server connections the run held.
+
+"default" stands for the values database.py derives from WEB_CONCURRENCY and
+DB_MAX_CONNECTIONS. Run one copy per uvicorn worker you plan to start to see the combined load
+on max_connections.
+
+    python -m benchmarks.pool_settings --clients 200 default 5:5:100 20:10:100 20:10:0 75:75:100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.database import courses, database
+from src.monitoring.metrics import TimedAsyncQueuePool
+from src.schemas import courses_dto
+
+
+def _parse_setting(value: str):
+    if value == "default":
+        return database.DB_POOL_SIZE, database.DB_MAX_OVERFLOW, database.DB_PREPARED_STATEMENT_CACHE_SIZE
+    pool_size, max_overflow, cache_size = (int(part) for part in value.split(":"))
+    return pool_size, max_overflow, cache_size
+
+
+def _url(cache_size: int) -> str:
+    return (
+        f"postgresql+asyncpg://{database.DB_USERNAME}:{database.DB_PASSWORD}@{database.DB_HOST}/{database.DB_NAME}"
+        f"?prepared_statement_cache_size={cache_size}"
+    )
+
+
+async def _client(session_factory, deadline: float, latencies: list, waits: list) -> None:
+    filter = courses_dto.CourseFilter(limit=20)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        async with session_factory() as session:
+            # Первый запрос сессии берёт соединение из пула - отдельно меряем ожидание
+            await session.connection()
+            waits.append(time.perf_counter() - started)
+            await courses.db_get_courses_page(session, filter)
+        latencies.append(time.perf_counter() - started)
+
+
+async def _sample_connections(engine, stop: asyncio.Event, peak: list) -> None:
+    query = select(func.count()).select_from(text("pg_stat_activity")).where(
+        text("datname = current_database()")
+    )
+    async with engine.connect() as conn:
+        while not stop.is_set():
+            peak[0] = max(peak[0], await conn.scalar(query))
+            await asyncio.sleep(0.2)
+
+
+async def _run(setting: str, clients: int, duration: float) -> None:
+    pool_size, max_overflow, cache_size = _parse_setting(setting)
+    engine = create_async_engine(
+        _url(cache_size),
+        poolclass=TimedAsyncQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=database.DB_POOL_TIMEOUT,
+        pool_pre_ping=database.DB_POOL_PRE_PING,
+    )
+    # Счётчик соединений ходит через свой движок, чтобы не занимать пул замера
+    monitor = create_async_engine(_url(0), pool_size=1, max_overflow=0)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    latencies, waits, peak = [], [], [0]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_connections(monitor, stop, peak))
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _client(session_factory, started + duration, latencies, waits) for _ in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        await sampler
+        await engine.dispose()
+        await monitor.dispose()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{pool_size:>4}:{max_overflow:<4} cache {cache_size:<4}"
+        f" {len(latencies) / elapsed:9.1f} req/s"
+        f"  p50 {statistics.median(latencies) * 1000:7.1f} ms"
+        f"  p99 {p99 * 1000:7.1f} ms"
+        f"  max pool wait {max(waits) * 1000:7.1f} ms"
+        f"  peak connections {peak[0]}"
+    )
+
+
+async def main(args) -> None:
+    for setting in args.settings:
+        await _run(setting, args.clients, args.duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("settings", nargs="*", default=["default", "5:5:100", "20:10:100", "20:10:0", "75:75:100"],
+                        help="POOL_SIZE:MAX_OVERFLOW:PREPARED_STATEMENT_CACHE_SIZE or default")
+    parser.add_argument("--clients", type=int, default=200, help="concurrent requests")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per setting")
+    asyncio.run(main(parser.parse_args()))
@@ -1,18 +1,44 @@
 from fastapi import FastAPI
+from sqlalchemy import text
 import uvicorn
 from src.routers.course_router import courses_router
 from src.routers.login_router import router
+from src.routers.points_router import points_router
+from src.routers.metrics_router import metrics_router
+from src.routers.me_router import me_router
 from src.database.database import engine
+from src.database import instrumentation
+from src.monitoring.metrics import MetricsMiddleware
 from src.database.models.models import Base
+from src.service.courses_service import cache_bus
+from src.service import banner_renditions, audit, save_banner
 
 app = FastAPI()
+if instrumentation.SQL_INSTRUMENTATION:
+    app.add_middleware(instrumentation.SqlTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(save_banner.BannerUploadLimitMiddleware)
 app.include_router(courses_router)
 app.include_router(router)
+app.include_router(points_router)
+app.include_router(metrics_router)
+app.include_router(me_router)
 
 @app.on_event("startup")
 async def startup_event():
     async with engine.begin() as conn:
+        # Нужно для триграммного индекса по названию курса
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+    await cache_bus.start()
+    await audit.writer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await cache_bus.stop()
+    await banner_renditions.shutdown()
+    await audit.writer.stop()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
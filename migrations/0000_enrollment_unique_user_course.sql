@@ -0,0 +1,31 @@
+-- Одна запись пользователя на курс (user-003).
+-- Идёт перед 0001: пересчёт enrolled_count не должен учитывать дубликаты.
+
+-- Прежняя проверка перед INSERT допускала гонку: у пары (user_id, course_id) могло остаться
+-- несколько записей. Оставляем самую раннюю, предпочитая registered; отметки посещаемости
+-- переносим на неё (повторы по дате убирает 0002)
+CREATE TEMP TABLE enrollment_duplicates AS
+SELECT id, keep_id
+FROM (
+    SELECT id,
+           first_value(id) OVER (
+               PARTITION BY user_id, course_id
+               ORDER BY status = 'registered' DESC, id
+           ) AS keep_id
+    FROM enrollment
+) AS ranked
+WHERE id <> keep_id;
+
+UPDATE attendance a
+SET enrollment_id = d.keep_id
+FROM enrollment_duplicates d
+WHERE a.enrollment_id = d.id;
+
+DELETE FROM enrollment e
+USING enrollment_duplicates d
+WHERE e.id = d.id;
+
+DROP TABLE enrollment_duplicates;
+
+ALTER TABLE enrollment
+    ADD CONSTRAINT uq_enrollment_user_course UNIQUE (user_id, course_id);
@@ -0,0 +1,19 @@
+-- Вместимость курса и счётчик занятых мест (user-004).
+-- create_all при старте не меняет существующие таблицы: на уже развёрнутой базе
+-- файлы из migrations/ применяются вручную по порядку, например
+--   psql "$DATABASE_URL" -1 -f migrations/0001_course_capacity.sql
+
+ALTER TABLE course
+    ADD COLUMN IF NOT EXISTS capacity integer,
+    ADD COLUMN IF NOT EXISTS enrolled_count integer NOT NULL DEFAULT 0;
+
+-- Занятые места - это уже существующие записи со статусом registered
+UPDATE course
+SET enrolled_count = counts.registered
+FROM (
+    SELECT course_id, count(*) AS registered
+    FROM enrollment
+    WHERE status = 'registered'
+    GROUP BY course_id
+) AS counts
+WHERE counts.course_id = course.id;
@@ -0,0 +1,11 @@
+-- Одна отметка на запись и дату занятия (user-006).
+
+-- Повторные переклички раньше добавляли строки: оставляем последнюю отметку
+DELETE FROM attendance a
+USING attendance newer
+WHERE newer.enrollment_id = a.enrollment_id
+  AND newer.lesson_date = a.lesson_date
+  AND newer.id > a.id;
+
+ALTER TABLE attendance
+    ADD CONSTRAINT uq_attendance_enrollment_lesson UNIQUE (enrollment_id, lesson_date);
@@ -0,0 +1,17 @@
+-- Агрегаты оценок курса и постраничная выдача отзывов (user-008).
+
+ALTER TABLE course
+    ADD COLUMN IF NOT EXISTS rating_count integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_sum double precision NOT NULL DEFAULT 0;
+
+UPDATE course
+SET rating_count = totals.rating_count,
+    rating_sum = totals.rating_sum
+FROM (
+    SELECT course_id, count(*) AS rating_count, sum(rating) AS rating_sum
+    FROM feedback
+    GROUP BY course_id
+) AS totals
+WHERE totals.course_id = course.id;
+
+CREATE INDEX IF NOT EXISTS ix_feedback_course_id_id ON feedback (course_id, id);
@@ -0,0 +1,4 @@
+-- Версия курса для проверки параллельных правок (user-011).
+
+ALTER TABLE course
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
@@ -0,0 +1,4 @@
+-- Уменьшенные копии баннера (user-016).
+
+ALTER TABLE course
+    ADD COLUMN IF NOT EXISTS banner_renditions json;
@@ -0,0 +1,13 @@
+-- Полнотекстовый и нечёткий поиск курсов (user-022).
+-- Выражение должно совпадать с CourseRow.search_vector (конфигурация SEARCH_CONFIG = russian).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE course
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_course_search_vector ON course USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS ix_course_name_trgm ON course USING gin (name gin_trgm_ops);
@@ -0,0 +1,8 @@
+-- Отметки посещаемости удаляются вместе с записью на курс (user-012).
+-- Курс удаляется одним DELETE, ORM дочерние строки не загружает: без ON DELETE CASCADE
+-- удаление курса с посещаемостью нарушает внешний ключ.
+
+ALTER TABLE attendance
+    DROP CONSTRAINT IF EXISTS attendance_enrollment_id_fkey,
+    ADD CONSTRAINT attendance_enrollment_id_fkey
+        FOREIGN KEY (enrollment_id) REFERENCES enrollment (id) ON DELETE CASCADE;
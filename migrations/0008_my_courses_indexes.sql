@@ -0,0 +1,11 @@
+-- Индексы для /me/teaching и списка участников курса (user-024).
+-- CREATE INDEX CONCURRENTLY не блокирует запись, но не работает внутри транзакции:
+-- этот файл применяется без -1, например
+--   psql "$DATABASE_URL" -f migrations/0008_my_courses_indexes.sql
+-- Если построение прервалось, индекс остаётся INVALID: удалите его и запустите файл снова.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_course_teachers_teacher_id_course_id
+    ON course_teachers (teacher_id, course_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_enrollment_course_id_user_id
+    ON enrollment (course_id, user_id);
@@ -1,11 +1,28 @@
 import time
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
 import jwt
 from decouple import config
+from pydantic import BaseModel, ConfigDict, ValidationError
 
 JWT_SECRET = config("secret")
 JWT_ALGORITHM = config("algorithm")
+TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", default=10000, cast=int)
+TOKEN_CACHE_TTL = config("TOKEN_CACHE_TTL", default=300, cast=int)
+
+
+class TokenClaims(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    user_id: int
+    role: str
+    expires: float
+
+
+# token -> (valid_until, claims); порядок ключей - порядок последнего обращения (LRU)
+_verified_tokens: "OrderedDict[str, Tuple[float, TokenClaims]]" = OrderedDict()
+
 
 def token_response(token: str):
     return {
@@ -28,4 +45,32 @@ def decodeJWT(token: jwt) -> dict:
         decoded_token = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         return decoded_token if decoded_token["expires"] >= time.time() else None
     except:
-        return {}
\ No newline at end of file
+        return {}
+
+
+def verifyJWT(token: str) -> Optional[TokenClaims]:
+    """
+    Returns claims of a valid token, None otherwise.
+    Verified tokens are cached, so repeat callers skip signature verification.
+    """
+    now = time.time()
+    cached = _verified_tokens.get(token)
+    if cached:
+        valid_until, claims = cached
+        if valid_until >= now:
+            _verified_tokens.move_to_end(token)
+            return claims
+        del _verified_tokens[token]
+
+    payload = decodeJWT(token)
+    if not payload:
+        return None
+    try:
+        claims = TokenClaims(**payload)
+    except ValidationError:
+        return None
+
+    _verified_tokens[token] = (min(now + TOKEN_CACHE_TTL, claims.expires), claims)
+    if len(_verified_tokens) > TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return claims
@@ -0,0 +1,107 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, values, column, literal, literal_column, Integer, Boolean, Date, RowMapping, Sequence
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import points
+from src.database.models import models
+from src.schemas import attendance_dto
+
+
+async def db_record_attendance(session: AsyncSession, course_id: int,
+                               roll_call: attendance_dto.RollCall) -> Sequence[RowMapping]:
+    # Повторная отметка одной записи в списке - берём последнюю
+    marks = {mark.enrollment_id: mark.is_attended for mark in roll_call.marks}
+    marks_table = values(
+        column("enrollment_id", Integer),
+        column("is_attended", Boolean),
+        name="marks"
+    ).data(list(marks.items()))
+
+    # Один INSERT ... SELECT: записи чужого курса отсекает JOIN, повторная отметка обновляет строку
+    source = (
+        select(marks_table.c.enrollment_id, literal(roll_call.lesson_date, Date), marks_table.c.is_attended)
+        .select_from(marks_table)
+        .join(models.EnrollmentRow, models.EnrollmentRow.id == marks_table.c.enrollment_id)
+        .where(models.EnrollmentRow.course_id == course_id)
+    )
+    upsert = insert(models.AttendanceRow).from_select(["enrollment_id", "lesson_date", "is_attended"], source)
+    # Строка возвращается, только если отметка появилась или изменилась; xmax = 0 - новая строка.
+    # Параллельная отметка того же занятия ждёт на конфликте и сравнивает уже с закоммиченным значением,
+    # поэтому повторная или одновременная отметка не даёт баллы дважды
+    upsert = upsert.on_conflict_do_update(
+        constraint="uq_attendance_enrollment_lesson",
+        set_={"is_attended": upsert.excluded.is_attended},
+        where=models.AttendanceRow.is_attended.is_distinct_from(upsert.excluded.is_attended)
+    ).returning(
+        models.AttendanceRow.enrollment_id,
+        models.AttendanceRow.is_attended,
+        literal_column("(xmax = 0)", Boolean).label("inserted")
+    ).cte("upserted")
+
+    result = await session.execute(
+        select(
+            upsert.c.is_attended,
+            upsert.c.inserted,
+            models.EnrollmentRow.user_id,
+            models.CourseRow.points_per_visit
+        )
+        .select_from(upsert)
+        .join(models.EnrollmentRow, models.EnrollmentRow.id == upsert.c.enrollment_id)
+        .join(models.CourseRow, models.CourseRow.id == models.EnrollmentRow.course_id)
+    )
+    changed = result.mappings().all()
+
+    rows = await _db_get_marks(session, course_id, roll_call.lesson_date, list(marks))
+    unknown = set(marks) - {row["enrollment_id"] for row in rows}
+    if unknown:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Записи на курс не найдены: {', '.join(map(str, sorted(unknown)))}"
+        )
+
+    changes = []
+    for row in changed:
+        if row["inserted"]:
+            visits = int(row["is_attended"])
+        else:
+            visits = 1 if row["is_attended"] else -1
+        if visits:
+            changes.append({
+                "user_id": row["user_id"],
+                "course_id": course_id,
+                "visits": visits,
+                "points": visits * row["points_per_visit"]
+            })
+    await points.db_apply_points(session, changes)
+    return rows
+
+
+async def _db_get_marks(session: AsyncSession, course_id: int, lesson_date: date,
+                        enrollment_ids: Optional[List[int]] = None) -> Sequence[RowMapping]:
+    query = (
+        select(
+            models.AttendanceRow.id,
+            models.AttendanceRow.enrollment_id,
+            models.AttendanceRow.lesson_date,
+            models.AttendanceRow.is_attended
+        )
+        .join(models.EnrollmentRow)
+        .where(
+            models.EnrollmentRow.course_id == course_id,
+            models.AttendanceRow.lesson_date == lesson_date
+        )
+        .order_by(models.AttendanceRow.enrollment_id)
+    )
+    if enrollment_ids is not None:
+        query = query.where(models.AttendanceRow.enrollment_id.in_(enrollment_ids))
+
+    result = await session.execute(query)
+    return result.mappings().all()
+
+
+async def db_get_attendance(session: AsyncSession, course_id: int, lesson_date: date) -> Sequence[RowMapping]:
+    return await _db_get_marks(session, course_id, lesson_date)
@@ -1,253 +1,615 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import selectinload
 
-from sqlalchemy.exc import SQLAlchemyError
 from src.database.models import models
+from src.database import lessons, points
 from src.schemas import courses_dto, enrollment_dto, feedback_dto
-from sqlalchemy import select, Sequence
-from typing import Optional, List
+from sqlalchemy import select, update, delete, Sequence, func, exists, case, or_, and_, RowMapping, literal, cast, \
+    Float
+from sqlalchemy.dialects.postgresql import insert
+from typing import Optional, List, AsyncIterator
 from datetime import date
-from src.service import save_banner
-from fastapi import UploadFile, HTTPException, status
+from fastapi import HTTPException, status
+
+EXPORT_BATCH_SIZE = 500
 
 
 async def db_create_course(session: AsyncSession, filter: models.CourseRow) -> models.CourseRow:
     session.add(filter)
     try:
-        await session.commit()
-        await session.refresh(filter)
+        await session.flush()
     except IntegrityError:
-        await session.rollback()
         raise ValueError("Error while adding course.")
+    await lessons.db_rebuild_lessons(session, filter.id, filter.schedule, filter.start_date, filter.end_date)
     return filter
 
 
-async def db_update_course_banner(session: AsyncSession, course_id: int, file: UploadFile) -> models.CourseRow:
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл должен быть изображением")
-
-    banner_url = await save_banner.save_banner_to_storage(file, course_id)
+async def db_update_course(session: AsyncSession, course_id: int, values: dict,
+                           version: Optional[int] = None) -> RowMapping:
+    # Один UPDATE ... RETURNING вместо SELECT + изменение в ORM + commit + refresh.
+    # Если передана версия, которую видел клиент, параллельная правка даёт 409, а не тихую перезапись
+    query = (
+        update(models.CourseRow)
+        .where(models.CourseRow.id == course_id)
+        .values(**values, version=models.CourseRow.version + 1)
+        .returning(*models.COURSE_COLUMNS, _course_teacher_ids())
+    )
+    if version is not None:
+        query = query.where(models.CourseRow.version == version)
 
-    query = select(models.CourseRow).where(models.CourseRow.id == course_id)
     result = await session.execute(query)
-    course = result.scalar_one_or_none()
+    course = result.mappings().one_or_none()
+    if course:
+        return course
 
-    if not course:
+    if version is not None:
+        exists_query = select(exists().where(models.CourseRow.id == course_id))
+        if (await session.execute(exists_query)).scalar():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Курс уже изменён другим пользователем, обновите данные и повторите"
+            )
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
+
+
+async def db_lock_course(session: AsyncSession, course_id: int) -> None:
+    # Блокировка строки до конца транзакции: курс не удалят, пока запрос с ним работает
+    result = await session.execute(
+        select(models.CourseRow.id)
+        .where(models.CourseRow.id == course_id)
+        .with_for_update(read=True, key_share=True)
+    )
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
-    course.banner_url = banner_url
-    await session.commit()
 
+
+async def db_update_course_banner(session: AsyncSession, course_id: int, banner_url: str) -> RowMapping:
+    # Самосоединение с old отдаёт в RETURNING значение до UPDATE - прежний баннер для удаления с диска.
+    # Уменьшенные копии нового баннера появятся после фоновой обработки
+    old = models.CourseRow.__table__.alias("old")
+    result = await session.execute(
+        update(models.CourseRow)
+        .where(models.CourseRow.id == course_id, old.c.id == models.CourseRow.id)
+        .values(banner_url=banner_url, banner_renditions=None, version=models.CourseRow.version + 1)
+        .returning(
+            *models.COURSE_COLUMNS,
+            _course_teacher_ids(),
+            old.c.banner_url.label("previous_banner_url")
+        )
+        .execution_options(synchronize_session=False)
+    )
+    course = result.mappings().one_or_none()
+    if course is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
     return course
 
 
-async def db_update_course_schedule(session: AsyncSession, course_id: int, schedule) -> models.CourseRow:
-    query = select(models.CourseRow).where(models.CourseRow.id == course_id)
-    result = await session.execute(query)
-    course = result.scalar_one_or_none()
-    if not course:
-        raise ValueError("Course not found.")
+async def db_lock_banner(session: AsyncSession, banner_url: str) -> None:
+    # Загрузки дедуплицируются по содержимому: запись файла, ссылка на него и удаление
+    # сериализуются по его имени до конца транзакции
+    await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(banner_url))))
+
+
+async def db_banner_in_use(session: AsyncSession, banner_url: str) -> bool:
+    result = await session.execute(select(exists().where(models.CourseRow.banner_url == banner_url)))
+    return result.scalar()
 
-    course.schedule = schedule
-    await session.commit()
-    await session.refresh(course)
+
+async def db_set_banner_renditions(session: AsyncSession, course_id: int, banner_url: str,
+                                   renditions: dict) -> None:
+    # Пока шла обработка, баннер могли заменить - тогда копии уже не нужны
+    await session.execute(
+        update(models.CourseRow)
+        .where(models.CourseRow.id == course_id, models.CourseRow.banner_url == banner_url)
+        .values(banner_renditions=renditions, version=models.CourseRow.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _rebuild_course_lessons(session: AsyncSession, course: RowMapping) -> None:
+    # Новое расписание проверено в DTO; ошибка возможна только у старого, сохранённого до проверки
+    try:
+        await lessons.db_rebuild_lessons(
+            session, course["id"], course["schedule"], course["start_date"], course["end_date"]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Расписание курса в неверном формате: {e}")
+
+
+async def db_update_course_schedule(session: AsyncSession, course_id: int, schedule) -> RowMapping:
+    course = await db_update_course(session, course_id, {"schedule": schedule})
+    await _rebuild_course_lessons(session, course)
     return course
 
 
 async def db_update_course_dates(session: AsyncSession, course_id: int, start_date: Optional[date] = None,
-                                 end_date: Optional[date] = None) -> models.CourseRow:
-    query = select(models.CourseRow).where(models.CourseRow.id == course_id)
-    result = await session.execute(query)
-    course = result.scalar_one_or_none()
-    if not course:
-        raise ValueError("Course not found.")
-
+                                 end_date: Optional[date] = None) -> RowMapping:
+    values = {}
     if start_date:
-        course.start_date = start_date
+        values["start_date"] = start_date
     if end_date:
-        course.end_date = end_date
-
-    await session.commit()
-    await session.refresh(course)
+        values["end_date"] = end_date
+    course = await db_update_course(session, course_id, values)
+    await _rebuild_course_lessons(session, course)
     return course
 
 
 async def db_update_course_info(session: AsyncSession, course_id: int,
-                                filter: courses_dto.CourseUpdate) -> models.CourseRow:
-    query = select(models.CourseRow).where(models.CourseRow.id == course_id)
-    result = await session.execute(query)
-    course = result.scalar_one_or_none()
+                                filter: courses_dto.CourseUpdate) -> RowMapping:
+    values = filter.model_dump(exclude_none=True, exclude={"teacher_ids", "version"})
+    if "banner_url" in values:
+        values["banner_renditions"] = None
+    course = await db_update_course(session, course_id, values, filter.version)
+    if values.keys() & {"schedule", "start_date", "end_date"}:
+        await _rebuild_course_lessons(session, course)
+    if "points_per_visit" in values:
+        await points.db_reprice_points(session, course_id, course["points_per_visit"])
+
+    if filter.capacity is not None:
+        promoted = await db_promote_waitlisted(session, course_id)
+        if promoted:
+            course = dict(course, enrolled_count=course["enrolled_count"] + promoted)
+
+    return course
 
+
+async def db_delete_course(session: AsyncSession, course_id: int) -> RowMapping:
+    # Записи, отзывы, посещения и преподавателей удаляют каскады в БД;
+    # RETURNING читает снимок до удаления, поэтому id преподавателей ещё на месте.
+    # Баллы курса каскад удалил бы без вычета из user_points, поэтому снимаем их заранее
+    await points.db_remove_points(session, course_id)
+    result = await session.execute(
+        delete(models.CourseRow)
+        .where(models.CourseRow.id == course_id)
+        .returning(*models.COURSE_COLUMNS, _course_teacher_ids())
+        .execution_options(synchronize_session=False)
+    )
+    course = result.mappings().one_or_none()
     if not course:
-        raise ValueError("Course not found.")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
+    return course
 
-    if filter.name is not None:
-        course.name = filter.name
-    if filter.description is not None:
-        course.description = filter.description
-    if filter.is_from_misis is not None:
-        course.is_from_misis = filter.is_from_misis
-    if filter.start_date is not None:
-        course.start_date = filter.start_date
-    if filter.end_date is not None:
-        course.end_date = filter.end_date
-    if filter.points_per_visit is not None:
-        course.points_per_visit = filter.points_per_visit
 
-    try:
-        await session.commit()
-        await session.refresh(course)
-    except Exception:
-        await session.rollback()
-        raise
+async def db_get_enrolled_users(session: AsyncSession, course_id: int) -> Sequence[models.UserRow]:
+    query = select(models.UserRow).join(models.EnrollmentRow).where(models.EnrollmentRow.course_id == course_id)
+    result = await session.execute(query)
+    users = result.scalars().all()
 
-    return course
+    return users
 
 
-async def db_delete_course(session: AsyncSession, course_id: int) -> models.CourseRow:
-    try:
-        # Получаем курс со всеми связями
-        result = await session.execute(
-            select(models.CourseRow)
-            .options(
-                selectinload(models.CourseRow.teachers),
-                selectinload(models.CourseRow.enrollments),
-                selectinload(models.CourseRow.feedback)
+def _course_teacher_ids():
+    return (
+        select(func.array_agg(models.course_teachers.c.teacher_id))
+        .where(models.course_teachers.c.course_id == models.CourseRow.id)
+        .correlate(models.CourseRow.__table__)
+        .scalar_subquery()
+        .label("teachers")
+    )
+
+
+def _courses_page_query(filter: courses_dto.CourseFilter, *columns):
+    query = (
+        select(*columns)
+        .order_by(models.CourseRow.id)
+        .limit(filter.limit)
+    )
+    if filter.after is not None:
+        query = query.where(models.CourseRow.id > filter.after)
+    return _apply_course_filters(query, filter)
+
+
+def _apply_course_filters(query, filter):
+    # Общие фильтры каталога и поиска
+    if filter.date_from is not None:
+        query = query.where(models.CourseRow.end_date >= filter.date_from)
+    if filter.date_to is not None:
+        query = query.where(models.CourseRow.start_date <= filter.date_to)
+    if filter.is_from_misis is not None:
+        query = query.where(models.CourseRow.is_from_misis == filter.is_from_misis)
+    if filter.teacher_id is not None:
+        query = query.where(
+            exists().where(
+                models.course_teachers.c.course_id == models.CourseRow.id,
+                models.course_teachers.c.teacher_id == filter.teacher_id
             )
-            .where(models.CourseRow.id == course_id)
-        )
-        course = result.scalar_one_or_none()
-        if not course:
-            raise ValueError(f"Course {course_id} not found")
-
-        # Сохраняем копию курса для возврата после удаления
-        course_copy = models.CourseRow(
-            id=course.id,
-            name=course.name,
-            description=course.description,
-            banner_url=course.banner_url,
-            schedule=course.schedule,
-            is_from_misis=course.is_from_misis,
-            start_date=course.start_date,
-            end_date=course.end_date,
-            points_per_visit=course.points_per_visit
         )
+    return query
 
-        # Удаляем курс
-        await session.delete(course)
-        await session.commit()
-        return course_copy
 
-    except SQLAlchemyError as e:
-        await session.rollback()
-        raise RuntimeError(f"Database error: {str(e)}") from e
+async def db_get_courses_page(session: AsyncSession, filter: courses_dto.CourseFilter) -> Sequence[RowMapping]:
+    # Только колонки курса и агрегированные id преподавателей, без загрузки связей
+    query = _courses_page_query(filter, *models.COURSE_COLUMNS, _course_teacher_ids())
+    result = await session.execute(query)
+    return result.mappings().all()
 
 
-async def db_get_enrolled_users(session: AsyncSession, course_id: int) -> Sequence[models.UserRow]:
-    query = select(models.UserRow).join(models.EnrollmentRow).where(models.EnrollmentRow.course_id == course_id)
-    result = await session.execute(query)
-    users = result.scalars().all()
+async def db_search_courses(session: AsyncSession, filter: courses_dto.CourseSearchFilter) -> Sequence[RowMapping]:
+    # Полнотекстовое совпадение (GIN по search_vector) или похожее слово в названии (GIN pg_trgm),
+    # релевантность - сумма обоих рангов; курсор - (rank, id) последней строки
+    ts_query = func.websearch_to_tsquery(models.SEARCH_CONFIG, filter.q)
+    rank = cast(
+        func.ts_rank_cd(models.CourseRow.search_vector, ts_query)
+        + func.word_similarity(filter.q, models.CourseRow.name),
+        Float
+    )
+    query = (
+        select(*models.COURSE_COLUMNS, _course_teacher_ids(), rank.label("rank"))
+        .where(or_(
+            models.CourseRow.search_vector.op("@@")(ts_query),
+            literal(filter.q).op("<%")(models.CourseRow.name)
+        ))
+        .order_by(rank.desc(), models.CourseRow.id)
+        .limit(filter.limit)
+    )
+    if filter.after is not None:
+        after_rank, after_id = filter.after_key()
+        query = query.where(or_(rank < after_rank, and_(rank == after_rank, models.CourseRow.id > after_id)))
+    query = _apply_course_filters(query, filter)
 
-    return users
+    result = await session.execute(query)
+    return result.mappings().all()
 
 
-async def db_get_all_courses(session) -> Sequence[models.CourseRow]:
+async def db_get_course(session: AsyncSession, course_id: int) -> RowMapping:
     result = await session.execute(
-        select(models.CourseRow)
-        .options(
-            selectinload(models.CourseRow.teachers),
-            selectinload(models.CourseRow.enrollments),
-            selectinload(models.CourseRow.feedback)
+        select(*models.COURSE_COLUMNS, _course_teacher_ids())
+        .where(models.CourseRow.id == course_id)
+    )
+    course = result.mappings().one_or_none()
+    if course is None:
+        raise HTTPException(status_code=404, detail="Курс не найден")
+    return course
+
+
+async def db_stream_courses(session: AsyncSession) -> AsyncIterator[RowMapping]:
+    # Серверный курсор: строки читаются пачками по EXPORT_BATCH_SIZE
+    result = await session.stream(
+        select(*models.COURSE_COLUMNS, _course_teacher_ids())
+        .order_by(models.CourseRow.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async for row in result.mappings():
+        yield row
+
+
+async def db_stream_enrolled_users(session: AsyncSession, course_id: int) -> AsyncIterator[RowMapping]:
+    result = await session.stream(
+        select(
+            models.UserRow.id,
+            models.UserRow.email,
+            models.UserRow.role,
+            models.EnrollmentRow.id.label("enrollment_id"),
+            models.EnrollmentRow.status
         )
+        .join(models.EnrollmentRow)
+        .where(models.EnrollmentRow.course_id == course_id)
+        .order_by(models.EnrollmentRow.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
     )
-    return result.scalars().all()
+    async for row in result.mappings():
+        yield row
+
+
+def _enrollment_integrity_error(e: IntegrityError) -> HTTPException:
+    # asyncpg кладёт исходную ошибку в __cause__, FK по умолчанию называются enrollment_<колонка>_fkey
+    constraint = getattr(e.orig.__cause__, "constraint_name", None)
+    if constraint == "enrollment_course_id_fkey":
+        return HTTPException(status_code=404, detail="Курс не найден")
+    if constraint == "enrollment_user_id_fkey":
+        return HTTPException(status_code=404, detail="Пользователь не найден")
+    return HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
 
 
 async def db_register_user_on_course(session: AsyncSession,
                                      enrollment_data: enrollment_dto.EnrollmentCreate) -> models.EnrollmentRow:
-    query_course = select(models.CourseRow).where(models.CourseRow.id == enrollment_data.course_id)
-    result_course = await session.execute(query_course)
-    course = result_course.scalar_one_or_none()
+    # Один запрос: CTE занимает место условным UPDATE (блокируется только строка этого курса),
+    # INSERT пишет registered или waitlisted. Существование курса и пользователя проверяют FK,
+    # дубликаты - uq_enrollment_user_course; в обоих случаях откат возвращает занятое место.
+    seat = (
+        update(models.CourseRow)
+        .where(
+            models.CourseRow.id == enrollment_data.course_id,
+            or_(
+                models.CourseRow.capacity.is_(None),
+                models.CourseRow.enrolled_count < models.CourseRow.capacity
+            )
+        )
+        .values(enrolled_count=models.CourseRow.enrolled_count + 1)
+        .returning(models.CourseRow.id)
+        .cte("seat")
+    )
+    status = case(
+        (exists(seat.select()), enrollment_dto.EnrollmentStatus.registered.value),
+        else_=enrollment_dto.EnrollmentStatus.waitlisted.value
+    )
+    query = (
+        insert(models.EnrollmentRow)
+        .add_cte(seat)
+        .values(
+            user_id=enrollment_data.user_id,
+            course_id=enrollment_data.course_id,
+            status=status
+        )
+        .on_conflict_do_nothing(constraint="uq_enrollment_user_course")
+        .returning(models.EnrollmentRow)
+    )
 
-    if not course:
-        raise HTTPException(status_code=404, detail="Курс не найден")
+    try:
+        result = await session.execute(query)
+        new_enrollment = result.scalar_one_or_none()
+    except IntegrityError as e:
+        raise _enrollment_integrity_error(e) from e
 
-    query_user = select(models.UserRow).where(models.UserRow.id == enrollment_data.user_id)
-    result_user = await session.execute(query_user)
-    user = result_user.scalar_one_or_none()
+    if not new_enrollment:
+        raise HTTPException(status_code=400, detail="Пользователь уже зарегистрирован на этот курс")
 
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return new_enrollment
 
-    query_existing_enrollment = select(models.EnrollmentRow).where(
-        models.EnrollmentRow.user_id == enrollment_data.user_id,
-        models.EnrollmentRow.course_id == enrollment_data.course_id
-    )
-    result_enrollment = await session.execute(query_existing_enrollment)
-    existing_enrollment = result_enrollment.scalar_one_or_none()
 
-    if existing_enrollment:
-        raise HTTPException(status_code=400, detail="Пользователь уже зарегистрирован на этот курс")
+async def db_bulk_register_users_on_courses(
+        session: AsyncSession,
+        items: List[enrollment_dto.BulkEnrollmentItem]
+) -> List[enrollment_dto.BulkEnrollmentRow]:
+    user_ids = {item.user_id for item in items}
+    course_ids = {item.course_id for item in items}
 
-    new_enrollment = models.EnrollmentRow(
-        user_id=enrollment_data.user_id,
-        course_id=enrollment_data.course_id,
-        status=enrollment_data.status
+    # Блокируем курсы в порядке id: это та же блокировка, что берёт UPDATE места при обычной записи
+    result = await session.execute(
+        select(models.CourseRow.id, models.CourseRow.capacity, models.CourseRow.enrolled_count)
+        .where(models.CourseRow.id.in_(course_ids))
+        .order_by(models.CourseRow.id)
+        .with_for_update()
     )
+    free_seats = {
+        course.id: None if course.capacity is None else course.capacity - course.enrolled_count
+        for course in result
+    }
 
-    try:
-        session.add(new_enrollment)
-        await session.commit()
-        await session.refresh(new_enrollment)
-        return new_enrollment
-    except SQLAlchemyError as e:
-        await session.rollback()
-        raise HTTPException(status_code=500, detail=f"Ошибка базы данных: {str(e)}")
+    result = await session.execute(select(models.UserRow.id).where(models.UserRow.id.in_(user_ids)))
+    known_users = set(result.scalars())
 
+    result = await session.execute(
+        select(models.EnrollmentRow.user_id, models.EnrollmentRow.course_id)
+        .where(
+            models.EnrollmentRow.user_id.in_(user_ids),
+            models.EnrollmentRow.course_id.in_(course_ids)
+        )
+    )
+    existing = {(row.user_id, row.course_id) for row in result}
+
+    results = []
+    new_rows = []
+    planned = set()
+    for item in items:
+        key = (item.user_id, item.course_id)
+        if item.course_id not in free_seats:
+            results.append(enrollment_dto.BulkEnrollmentResult.course_not_found)
+        elif item.user_id not in known_users:
+            results.append(enrollment_dto.BulkEnrollmentResult.user_not_found)
+        elif key in existing:
+            results.append(enrollment_dto.BulkEnrollmentResult.already_enrolled)
+        elif key in planned:
+            results.append(enrollment_dto.BulkEnrollmentResult.duplicate)
+        else:
+            planned.add(key)
+            seats = free_seats[item.course_id]
+            if seats is None or seats > 0:
+                status = enrollment_dto.EnrollmentStatus.registered
+                if seats is not None:
+                    free_seats[item.course_id] = seats - 1
+            else:
+                status = enrollment_dto.EnrollmentStatus.waitlisted
+            new_rows.append({"user_id": item.user_id, "course_id": item.course_id, "status": status.value})
+            results.append(None)
+
+    inserted = {}
+    if new_rows:
+        result = await session.execute(
+            insert(models.EnrollmentRow)
+            .values(new_rows)
+            .on_conflict_do_nothing(constraint="uq_enrollment_user_course")
+            .returning(
+                models.EnrollmentRow.id,
+                models.EnrollmentRow.user_id,
+                models.EnrollmentRow.course_id,
+                models.EnrollmentRow.status
+            )
+        )
+        inserted = {(row.user_id, row.course_id): row for row in result}
 
-async def db_write_feedback(session: AsyncSession, filter: feedback_dto.FeedbackCreate) -> models.FeedbackRow:
-    query_course = select(models.CourseRow).where(models.CourseRow.id == filter.course_id)
-    result_course = await session.execute(query_course)
-    course = result_course.scalar_one_or_none()
+    registered = {}
+    for row in inserted.values():
+        if row.status == enrollment_dto.EnrollmentStatus.registered.value:
+            registered[row.course_id] = registered.get(row.course_id, 0) + 1
+    if registered:
+        await session.execute(
+            update(models.CourseRow)
+            .where(models.CourseRow.id.in_(list(registered)))
+            .values(enrolled_count=models.CourseRow.enrolled_count + case(registered, value=models.CourseRow.id))
+        )
 
+    report = []
+    for item, item_result in zip(items, results):
+        enrollment_id = None
+        if item_result is None:
+            row = inserted.get((item.user_id, item.course_id))
+            if row is None:
+                # Успели записать параллельным запросом
+                item_result = enrollment_dto.BulkEnrollmentResult.already_enrolled
+            else:
+                item_result = enrollment_dto.BulkEnrollmentResult(row.status)
+                enrollment_id = row.id
+        report.append(enrollment_dto.BulkEnrollmentRow(
+            user_id=item.user_id,
+            course_id=item.course_id,
+            result=item_result,
+            enrollment_id=enrollment_id
+        ))
+    return report
+
+
+async def db_promote_waitlisted(session: AsyncSession, course_id: int) -> int:
+    # Блокируем строку курса, чтобы параллельные освобождения не раздали одно место дважды
+    result = await session.execute(
+        select(models.CourseRow.capacity, models.CourseRow.enrolled_count)
+        .where(models.CourseRow.id == course_id)
+        .with_for_update()
+    )
+    course = result.one_or_none()
     if not course:
+        return 0
+
+    waitlisted = (
+        select(models.EnrollmentRow.id)
+        .where(
+            models.EnrollmentRow.course_id == course_id,
+            models.EnrollmentRow.status == enrollment_dto.EnrollmentStatus.waitlisted.value
+        )
+        .order_by(models.EnrollmentRow.id)
+    )
+    if course.capacity is not None:
+        free_seats = course.capacity - course.enrolled_count
+        if free_seats <= 0:
+            return 0
+        waitlisted = waitlisted.limit(free_seats)
+
+    result = await session.execute(
+        update(models.EnrollmentRow)
+        .where(models.EnrollmentRow.id.in_(waitlisted))
+        .values(status=enrollment_dto.EnrollmentStatus.registered.value)
+        .returning(models.EnrollmentRow.id)
+    )
+    promoted = len(result.all())
+    if promoted:
+        await session.execute(
+            update(models.CourseRow)
+            .where(models.CourseRow.id == course_id)
+            .values(enrolled_count=models.CourseRow.enrolled_count + promoted)
+        )
+    return promoted
+
+
+async def db_unregister_user_from_course(session: AsyncSession, user_id: int,
+                                         course_id: int) -> models.EnrollmentRow:
+    result = await session.execute(
+        delete(models.EnrollmentRow)
+        .where(
+            models.EnrollmentRow.user_id == user_id,
+            models.EnrollmentRow.course_id == course_id
+        )
+        .returning(models.EnrollmentRow)
+    )
+    enrollment = result.scalar_one_or_none()
+    if not enrollment:
+        raise HTTPException(status_code=404, detail="Пользователь не записан на этот курс")
+    # Посещения ушли каскадом вместе с записью - баллы за них тоже
+    await points.db_remove_points(session, course_id, user_id)
+
+    # Освободившееся место сразу отдаём первому из листа ожидания
+    if enrollment.status == enrollment_dto.EnrollmentStatus.registered.value:
+        await session.execute(
+            update(models.CourseRow)
+            .where(models.CourseRow.id == course_id)
+            .values(enrolled_count=models.CourseRow.enrolled_count - 1)
+        )
+        await db_promote_waitlisted(session, course_id)
+    return enrollment
+
+
+async def db_write_feedback(session: AsyncSession, filter: feedback_dto.FeedbackCreate) -> models.FeedbackRow:
+    # Счётчики рейтинга обновляются в той же транзакции, UPDATE заодно проверяет, что курс есть
+    result = await session.execute(
+        update(models.CourseRow)
+        .where(models.CourseRow.id == filter.course_id)
+        .values(
+            rating_count=models.CourseRow.rating_count + 1,
+            rating_sum=models.CourseRow.rating_sum + filter.rating
+        )
+        .returning(models.CourseRow.id)
+    )
+    if result.scalar_one_or_none() is None:
         raise ValueError("Course not found")
 
-    new_feedback = models.FeedbackRow(
-        user_id=filter.user_id,
-        course_id=filter.course_id,
-        rating=filter.rating,
-        comment=filter.comment
+    result = await session.execute(
+        insert(models.FeedbackRow)
+        .values(
+            user_id=filter.user_id,
+            course_id=filter.course_id,
+            rating=filter.rating,
+            comment=filter.comment
+        )
+        .returning(models.FeedbackRow)
     )
+    return result.scalar_one()
 
-    session.add(new_feedback)
-    await session.commit()
-    await session.refresh(new_feedback)
 
-    return new_feedback
+async def db_get_feedback_page(session: AsyncSession, course_id: int, limit: int,
+                               after: Optional[int] = None) -> Sequence[models.FeedbackRow]:
+    query = (
+        select(models.FeedbackRow)
+        .where(models.FeedbackRow.course_id == course_id)
+        .order_by(models.FeedbackRow.id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(models.FeedbackRow.id > after)
 
+    result = await session.execute(query)
+    return result.scalars().all()
 
-async def get_course_by_id(session: AsyncSession, course_id: int,
-                           load_teachers: bool = False) -> Optional[models.CourseRow]:
-    try:
-        query = select(models.CourseRow).where(models.CourseRow.id == course_id)
 
-        if load_teachers:
-            query = query.options(selectinload(models.CourseRow.teachers))
+async def db_get_user_enrollments_page(session: AsyncSession, user_id: int, limit: int,
+                                      after: Optional[int] = None) -> Sequence[RowMapping]:
+    # Курсор - course_id: порядок совпадает с индексом uq_enrollment_user_course (user_id, course_id)
+    query = (
+        select(
+            models.EnrollmentRow.id.label("enrollment_id"),
+            models.EnrollmentRow.status,
+            *models.COURSE_COLUMNS,
+            _course_teacher_ids()
+        )
+        .join(models.CourseRow, models.CourseRow.id == models.EnrollmentRow.course_id)
+        .where(models.EnrollmentRow.user_id == user_id)
+        .order_by(models.EnrollmentRow.course_id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(models.EnrollmentRow.course_id > after)
 
-        result = await session.execute(query)
-        return result.scalar_one_or_none()
+    result = await session.execute(query)
+    return result.mappings().all()
+
+
+async def db_get_teaching_page(session: AsyncSession, teacher_id: int, limit: int,
+                               after: Optional[int] = None) -> Sequence[RowMapping]:
+    # Индекс ix_course_teachers_teacher_id_course_id
+    query = (
+        select(*models.COURSE_COLUMNS, _course_teacher_ids())
+        .join(models.course_teachers, models.course_teachers.c.course_id == models.CourseRow.id)
+        .where(models.course_teachers.c.teacher_id == teacher_id)
+        .order_by(models.course_teachers.c.course_id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(models.course_teachers.c.course_id > after)
 
-    except Exception as e:
-        raise ValueError(f"Database error: {str(e)}") from e
+    result = await session.execute(query)
+    return result.mappings().all()
 
-async def get_full_course(session: AsyncSession, course_id: int) -> models.CourseRow:
+
+async def _bump_course_version(session: AsyncSession, course_id: int) -> None:
+    # Состав преподавателей входит в DTO курса, поэтому меняет и его версию (ETag)
     result = await session.execute(
-        select(models.CourseRow)
-        .options(selectinload(models.CourseRow.teachers))
+        update(models.CourseRow)
         .where(models.CourseRow.id == course_id)
+        .values(version=models.CourseRow.version + 1)
+        .returning(models.CourseRow.id)
+        .execution_options(synchronize_session=False)
     )
-    return result.scalar_one_or_none()
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Курс не найден")
 
 
 async def db_add_course_teachers(
@@ -255,27 +617,17 @@ async def db_add_course_teachers(
         course_id: int,
         teacher_ids: List[int]
 ) -> None:
+    await _bump_course_version(session, course_id)
+    if not teacher_ids:
+        return
     try:
-        existing_links = await session.execute(
-            select(models.course_teachers).where(
-                models.course_teachers.course_id == course_id,
-                models.course_teachers.teacher_id.in_(teacher_ids)
-            )
+        # Уже назначенных преподавателей пропускает ON CONFLICT по первичному ключу
+        await session.execute(
+            insert(models.course_teachers)
+            .values([{"course_id": course_id, "teacher_id": teacher_id} for teacher_id in set(teacher_ids)])
+            .on_conflict_do_nothing()
         )
-        existing_ids = {link.teacher_id for link in existing_links.scalars()}
-        new_ids = [id for id in teacher_ids if id not in existing_ids]
-
-        if new_ids:
-            session.add_all([
-                models.course_teachers(
-                    course_id=course_id,
-                    teacher_id=teacher_id
-                ) for teacher_id in new_ids
-            ])
-            await session.commit()
-
     except IntegrityError as e:
-        await session.rollback()
         raise HTTPException(
             status_code=400,
             detail="Ошибка при добавлении преподавателей"
@@ -286,38 +638,17 @@ async def db_remove_course_teacher(
         course_id: int,
         teacher_id: int
 ) -> None:
-    try:
-        # Проверяем, существует ли связь
-        result = await session.execute(
-            select(models.course_teachers).where(
-                models.course_teachers.c.course_id == course_id,
-                models.course_teachers.c.teacher_id == teacher_id
-            )
-        )
-        link = result.scalar_one_or_none()
-        
-        if not link:
-            raise HTTPException(
-                status_code=404,
-                detail="Преподаватель не найден на данном курсе"
-            )
-        
-        # Удаляем связь
-        await session.execute(
-            models.course_teachers.delete().where(
-                models.course_teachers.c.course_id == course_id,
-                models.course_teachers.c.teacher_id == teacher_id
-            )
+    # Удаляем связь
+    result = await session.execute(
+        models.course_teachers.delete().where(
+            models.course_teachers.c.course_id == course_id,
+            models.course_teachers.c.teacher_id == teacher_id
         )
-        
-        await session.commit()
-        
-    except HTTPException as e:
-        await session.rollback()
-        raise e
-    except Exception as e:
-        await session.rollback()
+    )
+
+    if not result.rowcount:
         raise HTTPException(
-            status_code=500,
-            detail=f"Ошибка при удалении преподавателя с курса: {str(e)}"
-        )
\ No newline at end of file
+            status_code=404,
+            detail="Преподаватель не найден на данном курсе"
+        )
+    await _bump_course_version(session, course_id)
@@ -3,15 +3,52 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from decouple import config
+from src.database import instrumentation
+from src.monitoring.metrics import TimedAsyncQueuePool
+from typing import AsyncIterator, Awaitable, Callable, List
+import logging
+
+logger = logging.getLogger(__name__)
 
 DB_USERNAME = config("DB_USERNAME")
 DB_PASSWORD = config("DB_PASSWORD")
 DB_NAME = config("DB_NAME")
 DB_HOST = config("DB_HOST")
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+# 0 отключает кэш подготовленных запросов asyncpg - нужно за pgbouncer в режиме transaction
+DB_PREPARED_STATEMENT_CACHE_SIZE = config("DB_PREPARED_STATEMENT_CACHE_SIZE", default=100, cast=int)
+
+DATABASE_URL = (
+    f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+    f"?prepared_statement_cache_size={DB_PREPARED_STATEMENT_CACHE_SIZE}"
+)
 
-engine = create_async_engine(DATABASE_URL, pool_size=50, max_overflow=100, echo=True)
+# Все воркеры вместе не должны выбирать max_connections Postgres: по умолчанию каждый получает
+# свою долю того, что осталось после резерва (psql, LISTEN кэша, фоновые задачи)
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1, cast=int)
+DB_MAX_CONNECTIONS = config("DB_MAX_CONNECTIONS", default=100, cast=int)
+DB_RESERVED_CONNECTIONS = config("DB_RESERVED_CONNECTIONS", default=10, cast=int)
+_worker_connections = max(2, (DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) // max(1, WEB_CONCURRENCY))
+
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=_worker_connections // 2, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=_worker_connections - DB_POOL_SIZE, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", default=30000, cast=int)
+
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=TimedAsyncQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+)
+if instrumentation.SQL_INSTRUMENTATION:
+    instrumentation.instrument(engine)
 
 
 async_session = async_sessionmaker(
@@ -20,3 +57,42 @@ async_session = async_sessionmaker(
     class_=AsyncSession
 )
 
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """
+    One session per request: everything the request does is committed once at the end,
+    or rolled back if the handler raised.
+    """
+    async with async_session() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            session.info.pop("on_commit", None)
+            await session.rollback()
+            await _run_callbacks(session.info.pop("on_rollback", []))
+            raise
+        session.info.pop("on_rollback", None)
+        await _run_callbacks(session.info.pop("on_commit", []))
+
+
+async def _run_callbacks(callbacks: List[Callable[[], Awaitable[None]]]) -> None:
+    for callback in callbacks:
+        try:
+            await callback()
+        except Exception:
+            logger.exception("Session callback failed")
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Run `callback` once the request session has been committed; dropped on rollback.
+    """
+    session.info.setdefault("on_commit", []).append(callback)
+
+
+def on_rollback(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Run `callback` if the request session is rolled back; dropped on commit.
+    """
+    session.info.setdefault("on_rollback", []).append(callback)
@@ -0,0 +1,95 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from decouple import config
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+DEBUG = config("DEBUG", default=False, cast=bool)
+SQL_INSTRUMENTATION = config("SQL_INSTRUMENTATION", default=DEBUG, cast=bool)
+SQL_SLOW_MS = config("SQL_SLOW_MS", default=200, cast=float)
+# Столько одинаковых запросов за один HTTP-запрос считаем признаком N+1
+SQL_N_PLUS_ONE = config("SQL_N_PLUS_ONE", default=10, cast=int)
+MAX_LOGGED_PARAMS = 500
+
+
+class RequestSqlStats:
+    __slots__ = ("scope", "count", "duration", "statements")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    @property
+    def route(self) -> str:
+        # FastAPI кладёт найденный маршрут в scope, шаблон пути удобнее группировать, чем сам путь
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope["path"]
+
+
+request_sql_stats: ContextVar[Optional[RequestSqlStats]] = ContextVar("request_sql_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    stats = request_sql_stats.get()
+    route = stats.route if stats is not None else None
+
+    if elapsed * 1000 >= SQL_SLOW_MS:
+        logger.warning("Slow query %.1f ms on %s: %s; params: %.*r",
+                       elapsed * 1000, route, statement, MAX_LOGGED_PARAMS, parameters)
+
+    if stats is None:
+        return
+    stats.count += 1
+    stats.duration += elapsed
+    stats.statements[statement] += 1
+    if stats.statements[statement] == SQL_N_PLUS_ONE:
+        logger.warning("Possible N+1 on %s: same statement ran %d times in one request: %s",
+                       route, SQL_N_PLUS_ONE, statement)
+
+
+def instrument(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SqlTimingMiddleware:
+    """
+    Collects query count and DB time of each HTTP request and reports them in `Server-Timing`.
+    Queries run after the response has started (streamed exports) are counted but not reported.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSqlStats(scope)
+        token = request_sql_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_sql_stats.reset(token)
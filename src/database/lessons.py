@@ -0,0 +1,136 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, literal, union_all, RowMapping, Sequence
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from src.database.models import models
+
+# Ключи schedule: день недели по-английски или по-русски (полностью или сокращённо) либо номер ISO 1-7;
+# значения: "HH:MM-HH:MM" или список таких интервалов. Остальное - ошибка формата
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "понедельник": 0, "пн": 0,
+    "tuesday": 1, "tue": 1, "вторник": 1, "вт": 1,
+    "wednesday": 2, "wed": 2, "среда": 2, "ср": 2,
+    "thursday": 3, "thu": 3, "четверг": 3, "чт": 3,
+    "friday": 4, "fri": 4, "пятница": 4, "пт": 4,
+    "saturday": 5, "sat": 5, "суббота": 5, "сб": 5,
+    "sunday": 6, "sun": 6, "воскресенье": 6, "вс": 6,
+}
+
+
+def _weekday(key: Any) -> Optional[int]:
+    key = str(key).strip().lower()
+    if key.isdigit() and 1 <= int(key) <= 7:
+        return int(key) - 1
+    return WEEKDAYS.get(key)
+
+
+def _intervals(value: Any) -> List[Tuple[time, time]]:
+    values = value if isinstance(value, list) else [value]
+    intervals = []
+    for interval in values:
+        try:
+            if not isinstance(interval, str):
+                raise TypeError
+            start, end = (time(*map(int, part.strip().split(":"))) for part in interval.split("-"))
+        except (TypeError, ValueError):
+            raise ValueError(f"Интервал {interval!r} должен иметь вид ЧЧ:ММ-ЧЧ:ММ") from None
+        if start >= end:
+            raise ValueError(f"В интервале {interval!r} начало должно быть раньше конца")
+        intervals.append((start, end))
+    return intervals
+
+
+def parse_schedule(schedule: Optional[Dict[str, Any]]) -> Dict[int, List[Tuple[time, time]]]:
+    # Интервалы занятий по дням недели (0 - понедельник); ValueError, если формат не соблюдён
+    weekly = {}
+    for key, value in (schedule or {}).items():
+        weekday = _weekday(key)
+        if weekday is None:
+            raise ValueError(f"Неизвестный день недели в расписании: {key!r}")
+        weekly.setdefault(weekday, []).extend(_intervals(value))
+    return weekly
+
+
+def expand_schedule(schedule: Optional[Dict[str, Any]], start_date: date,
+                    end_date: date) -> List[Tuple[datetime, datetime]]:
+    weekly = parse_schedule(schedule)
+
+    lessons = []
+    if not weekly:
+        return lessons
+    day = start_date
+    while day <= end_date:
+        for start, end in weekly.get(day.weekday(), []):
+            lessons.append((datetime.combine(day, start), datetime.combine(day, end)))
+        day += timedelta(days=1)
+    return lessons
+
+
+async def db_rebuild_lessons(session: AsyncSession, course_id: int, schedule: Optional[Dict[str, Any]],
+                             start_date: date, end_date: date) -> None:
+    # Занятия пересобираются целиком при создании курса и при смене расписания или дат
+    await session.execute(delete(models.LessonRow).where(models.LessonRow.course_id == course_id))
+    lessons = expand_schedule(schedule, start_date, end_date)
+    if lessons:
+        await session.execute(
+            models.LessonRow.__table__.insert(),
+            [{"course_id": course_id, "starts_at": starts_at, "ends_at": ends_at} for starts_at, ends_at in lessons]
+        )
+
+
+async def db_get_course_schedules(session: AsyncSession) -> Sequence[RowMapping]:
+    result = await session.execute(
+        select(models.CourseRow.id, models.CourseRow.schedule, models.CourseRow.start_date, models.CourseRow.end_date)
+        .order_by(models.CourseRow.id)
+    )
+    return result.mappings().all()
+
+
+async def db_get_timetable(session: AsyncSession, user_id: int, starts_from: datetime,
+                           starts_before: datetime) -> Sequence[RowMapping]:
+    # Курсы пользователя: записан (registered) или преподаёт; занятия берутся по (course_id, starts_at)
+    my_courses = union_all(
+        select(models.EnrollmentRow.course_id, literal("student").label("role"))
+        .where(models.EnrollmentRow.user_id == user_id, models.EnrollmentRow.status == "registered"),
+        select(models.course_teachers.c.course_id, literal("teacher").label("role"))
+        .where(models.course_teachers.c.teacher_id == user_id)
+    ).subquery()
+
+    result = await session.execute(
+        select(
+            models.LessonRow.course_id,
+            models.CourseRow.name.label("course_name"),
+            models.LessonRow.starts_at,
+            models.LessonRow.ends_at,
+            my_courses.c.role
+        )
+        .join(my_courses, my_courses.c.course_id == models.LessonRow.course_id)
+        .join(models.CourseRow, models.CourseRow.id == models.LessonRow.course_id)
+        .where(models.LessonRow.starts_at >= starts_from, models.LessonRow.starts_at < starts_before)
+        .order_by(models.LessonRow.starts_at, models.LessonRow.course_id)
+    )
+    return result.mappings().all()
+
+
+async def db_find_clash(session: AsyncSession, user_id: int, course_id: int) -> Optional[str]:
+    # Название курса пользователя, занятие которого пересекается с занятием нового курса
+    new_lesson = aliased(models.LessonRow)
+    my_lesson = aliased(models.LessonRow)
+    result = await session.execute(
+        select(models.CourseRow.name)
+        .select_from(new_lesson)
+        .join(my_lesson, (my_lesson.starts_at < new_lesson.ends_at) & (my_lesson.ends_at > new_lesson.starts_at))
+        .join(
+            models.EnrollmentRow,
+            (models.EnrollmentRow.course_id == my_lesson.course_id)
+            & (models.EnrollmentRow.user_id == user_id)
+            & (models.EnrollmentRow.status == "registered")
+        )
+        .join(models.CourseRow, models.CourseRow.id == my_lesson.course_id)
+        .where(new_lesson.course_id == course_id, my_lesson.course_id != course_id)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
@@ -13,4 +13,14 @@ async def user_login(session: AsyncSession, uid: int) -> list:
     our_user = result_course.scalar_one_or_none()
     if not our_user:
         raise HTTPException(status_code=404, detail="Пользователя не существует!")
-    return [our_user.id, our_user.role]
\ No newline at end of file
+    return [our_user.id, our_user.role]
+
+async def db_create_user(session: AsyncSession, id: int, email: str, role: str) -> models.UserRow:
+    existing_user = await session.execute(select(models.UserRow).filter_by(email=email))
+    if existing_user.scalars().first():
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    new_user = models.UserRow(id=id, email=email, role=role)
+    session.add(new_user)
+    await session.flush()
+    return new_user
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Text, Float, JSON, DateTime, Table
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Text, Float, JSON, DateTime, Table, \
+    UniqueConstraint, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import declarative_base, relationship, deferred
 
 Base = declarative_base()
 
@@ -8,29 +10,59 @@ course_teachers = Table(
     'course_teachers', Base.metadata,
     Column('course_id', Integer, ForeignKey('course.id', ondelete="CASCADE"), primary_key=True),
     Column('teacher_id', Integer, ForeignKey('user.id'), primary_key=True),
-    Column('is_main', Boolean, default=False)
+    Column('is_main', Boolean, default=False),
+    # Первичный ключ начинается с course_id, курсы преподавателя ищутся по этому индексу
+    Index('ix_course_teachers_teacher_id_course_id', 'teacher_id', 'course_id')
 )
 
+# Конфигурация полнотекстового поиска; должна совпадать в колонке и в запросах
+SEARCH_CONFIG = 'russian'
+
 class CourseRow(Base):
     __tablename__ = 'course'
+    __table_args__ = (
+        Index('ix_course_search_vector', 'search_vector', postgresql_using='gin'),
+        # Нечёткий поиск по названию (опечатки), нужно расширение pg_trgm
+        Index('ix_course_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     banner_url = Column(String, nullable=True)
+    # {"thumb" | "card" | "hero": путь к WebP-копии}, заполняется фоновой обработкой баннера
+    banner_renditions = Column(JSON, nullable=True)
     schedule = Column(JSON, nullable=True)
     is_from_misis = Column(Boolean, default=False, nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
     points_per_visit = Column(Float, nullable=False)
-
+    capacity = Column(Integer, nullable=True)
+    enrolled_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_sum = Column(Float, nullable=False, default=0, server_default='0')
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # Поддерживается самой БД; в выборки курса не входит (см. COURSE_COLUMNS)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True
+    )))
+
+    # Дочерние строки удаляет сама БД (ON DELETE CASCADE), ORM их не загружает
     teachers = relationship(
         'UserRow',
         secondary=course_teachers,
-        back_populates='courses'
+        back_populates='courses',
+        passive_deletes=True
     )
-    feedback = relationship("FeedbackRow", back_populates="course", cascade="all, delete-orphan")
-    enrollments = relationship("EnrollmentRow", back_populates="course", cascade="all, delete-orphan")
+    feedback = relationship("FeedbackRow", back_populates="course", cascade="all, delete-orphan",
+                            passive_deletes=True)
+    enrollments = relationship("EnrollmentRow", back_populates="course", cascade="all, delete-orphan",
+                               passive_deletes=True)
+
+# Колонки курса для выборок и RETURNING, без служебного search_vector
+COURSE_COLUMNS = [column for column in CourseRow.__table__.c if column.name != 'search_vector']
 
 class UserRow(Base):
     __tablename__ = 'user'
@@ -52,6 +84,11 @@ class UserRow(Base):
 
 class EnrollmentRow(Base):
     __tablename__ = 'enrollment'
+    __table_args__ = (
+        # Уникальный индекс (user_id, course_id) обслуживает и курсы пользователя
+        UniqueConstraint('user_id', 'course_id', name='uq_enrollment_user_course'),
+        Index('ix_enrollment_course_id_user_id', 'course_id', 'user_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
@@ -60,20 +97,46 @@ class EnrollmentRow(Base):
 
     user = relationship("UserRow", back_populates="enrollments")
     course = relationship("CourseRow", back_populates="enrollments")
-    attendance = relationship("AttendanceRow", back_populates="enrollment", cascade="all, delete-orphan")
+    attendance = relationship("AttendanceRow", back_populates="enrollment", cascade="all, delete-orphan",
+                              passive_deletes=True)
 
 class AttendanceRow(Base):
     __tablename__ = 'attendance'
+    __table_args__ = (
+        UniqueConstraint('enrollment_id', 'lesson_date', name='uq_attendance_enrollment_lesson'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    enrollment_id = Column(Integer, ForeignKey('enrollment.id'), nullable=False)
+    enrollment_id = Column(Integer, ForeignKey('enrollment.id', ondelete="CASCADE"), nullable=False)
     lesson_date = Column(Date, nullable=False)
     is_attended = Column(Boolean, nullable=False)
 
     enrollment = relationship("EnrollmentRow", back_populates="attendance")
 
+class PointsRow(Base):
+    # Баллы пользователя на курсе, обновляются при отметке посещаемости
+    __tablename__ = 'points'
+    __table_args__ = (
+        Index('ix_points_course_id_points', 'course_id', 'points'),
+    )
+
+    user_id = Column(Integer, ForeignKey('user.id', ondelete="CASCADE"), primary_key=True)
+    course_id = Column(Integer, ForeignKey('course.id', ondelete="CASCADE"), primary_key=True)
+    visits = Column(Integer, nullable=False, default=0, server_default='0')
+    points = Column(Float, nullable=False, default=0, server_default='0')
+
+class UserPointsRow(Base):
+    # Сумма баллов пользователя по всем курсам, для общего рейтинга
+    __tablename__ = 'user_points'
+
+    user_id = Column(Integer, ForeignKey('user.id', ondelete="CASCADE"), primary_key=True)
+    points = Column(Float, nullable=False, default=0, server_default='0', index=True)
+
 class FeedbackRow(Base):
     __tablename__ = 'feedback'
+    __table_args__ = (
+        Index('ix_feedback_course_id_id', 'course_id', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     course_id = Column(Integer, ForeignKey('course.id', ondelete="CASCADE"), nullable=False)
@@ -92,4 +155,17 @@ class LogRow(Base):
     action = Column(String, nullable=False)
     timestamp = Column(DateTime, nullable=False)
 
-    user = relationship("UserRow", back_populates="logs")
\ No newline at end of file
+    user = relationship("UserRow", back_populates="logs")
+
+
+class LessonRow(Base):
+    # Занятия курса, развёрнутые из schedule на период start_date..end_date
+    __tablename__ = 'lesson'
+    __table_args__ = (
+        Index('ix_lesson_course_id_starts_at', 'course_id', 'starts_at'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    course_id = Column(Integer, ForeignKey('course.id', ondelete="CASCADE"), nullable=False)
+    starts_at = Column(DateTime, nullable=False)
+    ends_at = Column(DateTime, nullable=False)
@@ -0,0 +1,137 @@
+from typing import List, Optional
+
+from sqlalchemy import select, delete, update, func, text, RowMapping, Sequence
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import models
+
+
+async def db_apply_points(session: AsyncSession, changes: List[dict]) -> None:
+    # changes: [{user_id, course_id, visits, points}] - приращения, коммит делает вызывающий
+    if not changes:
+        return
+
+    query = insert(models.PointsRow).values(changes)
+    await session.execute(
+        query.on_conflict_do_update(
+            index_elements=[models.PointsRow.user_id, models.PointsRow.course_id],
+            set_={
+                "visits": models.PointsRow.visits + query.excluded.visits,
+                "points": models.PointsRow.points + query.excluded.points
+            }
+        )
+    )
+
+    totals = {}
+    for change in changes:
+        totals[change["user_id"]] = totals.get(change["user_id"], 0) + change["points"]
+    query = insert(models.UserPointsRow).values(
+        [{"user_id": user_id, "points": points} for user_id, points in totals.items()]
+    )
+    await session.execute(
+        query.on_conflict_do_update(
+            index_elements=[models.UserPointsRow.user_id],
+            set_={"points": models.UserPointsRow.points + query.excluded.points}
+        )
+    )
+
+
+async def db_remove_points(session: AsyncSession, course_id: int, user_id: Optional[int] = None) -> None:
+    # Баллы курса (или одного пользователя на курсе) удаляются и вычитаются из итогов одним запросом.
+    # Вызывается до удаления курса или записи: каскад убрал бы строки points, не тронув user_points
+    query = delete(models.PointsRow).where(models.PointsRow.course_id == course_id)
+    if user_id is not None:
+        query = query.where(models.PointsRow.user_id == user_id)
+    removed = query.returning(models.PointsRow.user_id, models.PointsRow.points).cte("removed")
+    await session.execute(
+        update(models.UserPointsRow)
+        .where(models.UserPointsRow.user_id == removed.c.user_id)
+        .values(points=models.UserPointsRow.points - removed.c.points)
+    )
+
+
+async def db_reprice_points(session: AsyncSession, course_id: int, points_per_visit: float) -> None:
+    # Новая цена посещения пересчитывает баллы курса; разница с прежним значением (самосоединение old
+    # видит строку до UPDATE) применяется к итогам пользователей в том же запросе
+    old = models.PointsRow.__table__.alias("old")
+    changed = (
+        update(models.PointsRow)
+        .where(
+            models.PointsRow.course_id == course_id,
+            old.c.user_id == models.PointsRow.user_id,
+            old.c.course_id == models.PointsRow.course_id
+        )
+        .values(points=models.PointsRow.visits * points_per_visit)
+        .returning(models.PointsRow.user_id, (models.PointsRow.points - old.c.points).label("delta"))
+        .cte("changed")
+    )
+    await session.execute(
+        update(models.UserPointsRow)
+        .where(models.UserPointsRow.user_id == changed.c.user_id)
+        .values(points=models.UserPointsRow.points + changed.c.delta)
+    )
+
+
+async def db_get_user_points(session: AsyncSession, user_id: int) -> Sequence[RowMapping]:
+    result = await session.execute(
+        select(models.PointsRow.course_id, models.PointsRow.visits, models.PointsRow.points)
+        .where(models.PointsRow.user_id == user_id)
+        .order_by(models.PointsRow.course_id)
+    )
+    return result.mappings().all()
+
+
+async def db_get_leaderboard(session: AsyncSession, limit: int,
+                             course_id: Optional[int] = None) -> Sequence[RowMapping]:
+    # Рейтинг курса идёт по индексу (course_id, points), общий - по индексу user_points.points
+    table = models.UserPointsRow if course_id is None else models.PointsRow
+    query = (
+        select(
+            func.rank().over(order_by=table.points.desc()).label("rank"),
+            table.user_id,
+            table.points
+        )
+        .order_by(table.points.desc(), table.user_id)
+        .limit(limit)
+    )
+    if course_id is not None:
+        query = query.where(models.PointsRow.course_id == course_id)
+
+    result = await session.execute(query)
+    return result.mappings().all()
+
+
+async def db_rebuild_points(session: AsyncSession) -> None:
+    # Блокировка не даёт параллельной отметке посещаемости применить дельту к старым данным
+    await session.execute(text("LOCK TABLE points, user_points IN EXCLUSIVE MODE"))
+    await session.execute(delete(models.PointsRow))
+    await session.execute(delete(models.UserPointsRow))
+
+    visits = func.count(models.AttendanceRow.id)
+    await session.execute(
+        insert(models.PointsRow).from_select(
+            ["user_id", "course_id", "visits", "points"],
+            select(
+                models.EnrollmentRow.user_id,
+                models.EnrollmentRow.course_id,
+                visits,
+                visits * models.CourseRow.points_per_visit
+            )
+            .join(models.AttendanceRow, models.AttendanceRow.enrollment_id == models.EnrollmentRow.id)
+            .join(models.CourseRow, models.CourseRow.id == models.EnrollmentRow.course_id)
+            .where(models.AttendanceRow.is_attended.is_(True))
+            .group_by(
+                models.EnrollmentRow.user_id,
+                models.EnrollmentRow.course_id,
+                models.CourseRow.points_per_visit
+            )
+        )
+    )
+    await session.execute(
+        insert(models.UserPointsRow).from_select(
+            ["user_id", "points"],
+            select(models.PointsRow.user_id, func.sum(models.PointsRow.points))
+            .group_by(models.PointsRow.user_id)
+        )
+    )
@@ -0,0 +1,162 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Счётчики живут в памяти воркера и меняются только из его event loop, поэтому блокировки не нужны.
+# При нескольких воркерах Prometheus собирает каждый отдельно (или через общий порт - по очереди)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # Последняя ячейка - +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, **labels) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {self.count}')
+        lines.append(f"{name}_sum{_labels(**labels)} {self.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {self.count}")
+        return lines
+
+
+request_latency: Dict[Tuple[str, str], Histogram] = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+requests_total: Dict[Tuple[str, str, int], int] = defaultdict(int)
+request_errors: Dict[Tuple[str, str], int] = defaultdict(int)
+requests_in_flight = 0
+pool_checkout_wait = Histogram(POOL_WAIT_BUCKETS)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long each checkout waited for a free connection.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def _route(scope: dict) -> str:
+    # Шаблон маршрута, а не сам путь: иначе по метке на каждый id
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Per-route latency histogram, request and 5xx counters, in-flight gauge.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global requests_in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Если приложение упало до ответа, наружу уйдёт 500
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        requests_in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight -= 1
+            key = (scope["method"], _route(scope))
+            request_latency[key].observe(time.perf_counter() - started)
+            requests_total[(*key, status_code)] += 1
+            if status_code >= 500:
+                request_errors[key] += 1
+
+
+def render(pool, audit_stats: dict) -> str:
+    """
+    All metrics of this worker in Prometheus text format.
+    """
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), histogram in request_latency.items():
+        lines.extend(histogram.render("http_request_duration_seconds", method=method, route=route))
+
+    lines += ["# HELP http_requests_total Requests by route and status.", "# TYPE http_requests_total counter"]
+    for (method, route, status_code), count in requests_total.items():
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status_code)} {count}")
+
+    lines += ["# HELP http_request_errors_total Requests answered with 5xx.", "# TYPE http_request_errors_total counter"]
+    for (method, route), count in request_errors.items():
+        lines.append(f"http_request_errors_total{_labels(method=method, route=route)} {count}")
+
+    lines += [
+        "# HELP http_requests_in_flight Requests being processed.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {requests_in_flight}",
+        "# HELP db_pool_size Configured pool size.",
+        "# TYPE db_pool_size gauge",
+        f"db_pool_size {pool.size()}",
+        "# HELP db_pool_checked_out Connections in use.",
+        "# TYPE db_pool_checked_out gauge",
+        f"db_pool_checked_out {pool.checkedout()}",
+        "# HELP db_pool_overflow Connections opened above pool size (negative: not yet opened).",
+        "# TYPE db_pool_overflow gauge",
+        f"db_pool_overflow {pool.overflow()}",
+        "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.",
+        "# TYPE db_pool_checkout_wait_seconds histogram",
+    ]
+    lines.extend(pool_checkout_wait.render("db_pool_checkout_wait_seconds"))
+
+    lines += [
+        "# HELP audit_events_queued Audit events waiting to be written.",
+        "# TYPE audit_events_queued gauge",
+        f"audit_events_queued {audit_stats['queued']}",
+    ]
+    for outcome in ("written", "dropped", "failed"):
+        lines += [
+            f"# HELP audit_events_{outcome}_total Audit events {outcome}.",
+            f"# TYPE audit_events_{outcome}_total counter",
+            f"audit_events_{outcome}_total {audit_stats[outcome]}",
+        ]
+    return "\n".join(lines) + "\n"
@@ -1,118 +1,346 @@
-from typing import List
+from typing import List, Optional
+from datetime import date
 
-from fastapi import APIRouter, status, UploadFile, File, Depends, HTTPException, Body
+from fastapi import APIRouter, status, UploadFile, File, Depends, HTTPException, Body, Query, Header, Response
+from fastapi.responses import StreamingResponse, FileResponse, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import Sequence
 
 from src.service import courses_service
-from src.schemas import courses_dto, user_dto, enrollment_dto, feedback_dto
+from src.schemas import courses_dto, user_dto, enrollment_dto, feedback_dto, attendance_dto
+from src.schemas.export_dto import ExportFormat
+from src.service import export, save_banner
 import os
-from src.auth.handler_auth import decodeJWT
-from src.auth.bearer_auth import JWTBearer
+from src.auth.handler_auth import TokenClaims
+from src.auth.bearer_auth import jwt_bearer
+from src.database.database import get_session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-UPLOAD_FOLDER = "courses/banners"
+UPLOAD_FOLDER = save_banner.BANNER_DIR
 courses_router = APIRouter(tags=['courses'])
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Ответ можно хранить только в кэше клиента и только с ревалидацией по ETag
+CATALOG_CACHE_CONTROL = "private, no-cache"
+# Содержимое файла с хэшем в имени никогда не меняется
+HASHED_BANNER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+BANNER_CACHE_CONTROL = "public, no-cache"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Сравнение для If-None-Match слабое: префикс W/ игнорируется
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return f'"{etag}"' in candidates
+
+
+def _conditional_headers(response: Response, etag: str) -> dict:
+    headers = {"ETag": f'"{etag}"', "Cache-Control": CATALOG_CACHE_CONTROL}
+    response.headers.update(headers)
+    return headers
+
 
 @courses_router.post('/course', response_model=courses_dto.Course, status_code=status.HTTP_201_CREATED)
-async def create_course(course: courses_dto.CourseCreate, jwt: JWTBearer = Depends(JWTBearer())) -> courses_dto.Course:
+async def create_course(course: courses_dto.CourseCreate,
+                        user: TokenClaims = Depends(jwt_bearer),
+                        session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
     """
     Creating new course. Only admin access.
 
     :param course:
-    :param jwt:
+    :param user:
     :return: course:
     """
-    role = decodeJWT(jwt).get('role')
-    return await courses_service.create_course(role, course)
+    return await courses_service.create_course(user, session, course)
 
 
-@courses_router.put('/course/{course_id}', response_model=courses_dto.Course,
-                    dependencies=[Depends(JWTBearer())])
+@courses_router.put('/course/{course_id}/banner', response_model=courses_dto.Course)
 async def update_banner(course_id: int, file: UploadFile = File(...),
-                        jwt: JWTBearer = Depends(JWTBearer())) -> courses_dto.Course:
+                        user: TokenClaims = Depends(jwt_bearer),
+                        session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
     """
     Update banner. Admin and teacher access.
 
     :param course_id:
     :param file:
-    :param jwt:
+    :param user:
     :return:
     """
-    role = decodeJWT(jwt).get('role')
-    return await courses_service.update_banner(role, course_id, file)
+    return await courses_service.update_banner(user, session, course_id, file)
+
+
+@courses_router.get("/banners/{filename}", status_code=status.HTTP_200_OK)
+async def get_banner(filename: str, if_none_match: Optional[str] = Header(None)) -> FileResponse:
+    """
+    Banner or one of its renditions. Public, supports Range and conditional requests.
+
+    :param filename: file name from banner_url or banner_renditions
+    :return: image
+    """
+    if not save_banner.BANNER_NAME_RE.fullmatch(filename):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Баннер не найден")
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Баннер не найден")
 
+    headers = {"Cache-Control": BANNER_CACHE_CONTROL}
+    if save_banner.HASHED_BANNER_RE.fullmatch(filename):
+        # Имя и есть хэш содержимого, поэтому ETag строгий и не зависит от mtime
+        etag = os.path.splitext(filename)[0]
+        headers = {"Cache-Control": HASHED_BANNER_CACHE_CONTROL, "ETag": f'"{etag}"'}
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, stat_result=stat_result, headers=headers)
 
-# @courses_router.put('/course/{course_id}/update_schedule', response_model=courses_dto.Course,
-#                     dependencies=[Depends(JWTBearer())])
+
+# @courses_router.put('/course/{course_id}/update_schedule', response_model=courses_dto.Course)
 # async def update_schedule(course_id: int, schedule: courses_dto.CourseUpdate,
-#                           jwt: JWTBearer = Depends(JWTBearer())) -> courses_dto.Course:
-#     role = decodeJWT(jwt).get('role')
-#     return await courses_service.update_schedule(role, course_id, schedule)
+#                           user: TokenClaims = Depends(jwt_bearer),
+#                           session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
+#     return await courses_service.update_schedule(user, session, course_id, schedule)
 
 
-@courses_router.delete('/course/{course_id}/', response_model=courses_dto.Course,
-                       dependencies=[Depends(JWTBearer())], status_code=status.HTTP_200_OK)
-async def delete_course(course_id: int, jwt: JWTBearer = Depends(JWTBearer())) -> courses_dto.Course:
-    role = decodeJWT(jwt).get('role')
-    return await courses_service.delete_course(role, course_id)
+@courses_router.delete('/course/{course_id}/', response_model=courses_dto.Course, status_code=status.HTTP_200_OK)
+async def delete_course(course_id: int, user: TokenClaims = Depends(jwt_bearer),
+                        session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
+    return await courses_service.delete_course(user, session, course_id)
 
 
-@courses_router.put("/course/{course_id}", dependencies=[Depends(JWTBearer())],
+@courses_router.put("/course/{course_id}",
                     response_model=courses_dto.Course, status_code=status.HTTP_200_OK)
 async def update_course(course_id: int, filter: courses_dto.CourseUpdate,
-                        jwt: JWTBearer = Depends(JWTBearer())) -> courses_dto.Course:
-    role = decodeJWT(jwt).get('role')
-    return await courses_service.update_course(role, course_id, filter)
+                        user: TokenClaims = Depends(jwt_bearer),
+                        session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
+    return await courses_service.update_course(user, session, course_id, filter)
 
 
-@courses_router.get("/course/{course_id}/enrollments", dependencies=[Depends(JWTBearer())],
+@courses_router.get("/course/{course_id}/enrollments",
                     response_model=list[user_dto.User], status_code=status.HTTP_200_OK)
-async def get_enrollments(course_id: int, jwt: JWTBearer = Depends(JWTBearer())) -> list[user_dto.User]:
-    role = decodeJWT(jwt).get('role')
-    return await courses_service.get_all_users_in_course(role, course_id)
+async def get_enrollments(course_id: int, user: TokenClaims = Depends(jwt_bearer),
+                          session: AsyncSession = Depends(get_session)) -> list[user_dto.User]:
+    return await courses_service.get_all_users_in_course(user, session, course_id)
+
 
+@courses_router.get("/courses", response_model=courses_dto.CoursePage, status_code=status.HTTP_200_OK,
+                    dependencies=[Depends(jwt_bearer)])
+async def get_courses(response: Response, filter: courses_dto.CourseFilter = Depends(),
+                      if_none_match: Optional[str] = Header(None),
+                      session: AsyncSession = Depends(get_session)) -> courses_dto.CoursePage:
+    """
+    Courses catalog page, ordered by id. Pass `next_after` of the previous page as `after`
+    to get the next one; `next_after` is null on the last page.
+    Answers 304 when `If-None-Match` carries the current ETag of the page.
+
+    :param filter: limit, after, date range and is_from_misis/teacher_id filters
+    :param if_none_match: ETag from a previous response
+    :return: page of courses
+    """
+    etag, page = await courses_service.get_courses_page(session, filter)
+    headers = _conditional_headers(response, etag)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # DTO собраны из строк БД без валидации; отдаём их сразу, минуя повторную проверку по response_model
+    return ORJSONResponse(page.model_dump(), headers=headers)
 
-@courses_router.get("/courses", response_model=List[courses_dto.Course], status_code=status.HTTP_200_OK,
-                    dependencies=[Depends(JWTBearer())])
-async def get_courses() -> Sequence[courses_dto.Course]:
-    return await courses_service.get_all_courses()
+
+@courses_router.get("/courses/search", response_model=courses_dto.CourseSearchPage, status_code=status.HTTP_200_OK,
+                    dependencies=[Depends(jwt_bearer)])
+async def search_courses(filter: courses_dto.CourseSearchFilter = Depends(),
+                         session: AsyncSession = Depends(get_session)) -> courses_dto.CourseSearchPage:
+    """
+    Full-text and typo-tolerant search over course names and descriptions, most relevant first.
+    Pass `next_after` of the previous page as `after` to get the next one.
+
+    :param filter: q, limit, after and the catalog filters
+    :return: page of courses
+    """
+    page = await courses_service.search_courses(session, filter)
+    return ORJSONResponse(page.model_dump())
+
+
+@courses_router.get("/course/{course_id}", response_model=courses_dto.Course, status_code=status.HTTP_200_OK,
+                    dependencies=[Depends(jwt_bearer)])
+async def get_course(course_id: int, response: Response, if_none_match: Optional[str] = Header(None),
+                     session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
+    """
+    Single course with its teacher ids; served from the catalog cache when possible.
+    Answers 304 when `If-None-Match` carries the current ETag of the course.
+
+    :param course_id: id of the course
+    :param if_none_match: ETag from a previous response
+    :return: course
+    """
+    etag, course = await courses_service.get_course(session, course_id)
+    headers = _conditional_headers(response, etag)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return course
+
+
+@courses_router.get("/cache/stats", status_code=status.HTTP_200_OK)
+async def get_cache_stats(user: TokenClaims = Depends(jwt_bearer)) -> dict:
+    """
+    Hit/miss counters and sizes of this worker's catalog cache. Admin only.
+
+    :return: stats per cache
+    """
+    return await courses_service.get_cache_stats(user)
+
+
+@courses_router.get("/courses/export", status_code=status.HTTP_200_OK)
+async def export_courses(format: ExportFormat = ExportFormat.ndjson,
+                         user: TokenClaims = Depends(jwt_bearer)) -> StreamingResponse:
+    """
+    Full course catalog as NDJSON or CSV, streamed row by row. Only admin access.
+
+    :param format: ndjson or csv
+    :param user:
+    :return:
+    """
+    rows = await courses_service.export_courses(user, format)
+    return StreamingResponse(rows, media_type=export.MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="courses.{format.value}"'})
+
+
+@courses_router.get("/course/{course_id}/enrollments/export", status_code=status.HTTP_200_OK)
+async def export_enrollments(course_id: int, format: ExportFormat = ExportFormat.ndjson,
+                             user: TokenClaims = Depends(jwt_bearer)) -> StreamingResponse:
+    """
+    Users enrolled on a course as NDJSON or CSV, streamed row by row. Admin and teacher access.
+
+    :param course_id:
+    :param format: ndjson or csv
+    :param user:
+    :return:
+    """
+    rows = await courses_service.export_enrolled_users(user, course_id, format)
+    filename = f"course_{course_id}_enrollments.{format.value}"
+    return StreamingResponse(rows, media_type=export.MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 @courses_router.post('/courses/{course_id}/teachers', response_model=courses_dto.Course,
-    status_code=status.HTTP_200_OK, dependencies=[Depends(JWTBearer())])
+    status_code=status.HTTP_200_OK)
 async def add_course_teachers(course_id: int, teacher_ids: List[int],
-                              jwt: JWTBearer = Depends(JWTBearer())) -> courses_dto.Course:
+                              user: TokenClaims = Depends(jwt_bearer),
+                              session: AsyncSession = Depends(get_session)) -> courses_dto.Course:
     """
     Adding teachers to a course. Available to course admins and teachers.
 
     :param course_id: Course ID
     :param teacher_ids: List of teachers ID
-    :param jwt: Auth token
+    :param user: Token claims
     :return: Updated course
     """
-    user_id = decodeJWT(jwt).get('user_id')
-    role = decodeJWT(jwt).get('role')
-    return await courses_service.add_course_teachers(role, user_id, course_id, teacher_ids)
+    return await courses_service.add_course_teachers(user, session, course_id, teacher_ids)
 
 
-@courses_router.post("/enroll", response_model=enrollment_dto.Enrollment, status_code=status.HTTP_201_CREATED,
-                     dependencies=[Depends(JWTBearer())])
-async def enroll_on_course(course_id: int = Body(..., embed=True), jwt: JWTBearer = Depends(JWTBearer())) -> enrollment_dto.Enrollment:
-    user_id = decodeJWT(jwt).get('user_id')
-    
+@courses_router.post("/enroll", response_model=enrollment_dto.Enrollment, status_code=status.HTTP_201_CREATED)
+async def enroll_on_course(course_id: int = Body(..., embed=True),
+                           user: TokenClaims = Depends(jwt_bearer),
+                           session: AsyncSession = Depends(get_session)) -> enrollment_dto.Enrollment:
     enrollment_data = enrollment_dto.EnrollmentCreate(
         course_id=course_id,
-        user_id=user_id
+        user_id=user.user_id
     )
-    return await courses_service.register_user_on_course(enrollment_data)
+    return await courses_service.register_user_on_course(session, enrollment_data)
+
+
+@courses_router.post("/enroll/bulk", response_model=enrollment_dto.BulkEnrollmentReport,
+                     status_code=status.HTTP_200_OK)
+async def bulk_enroll(items: List[enrollment_dto.BulkEnrollmentItem] = Body(
+                          ..., min_length=1, max_length=courses_service.BULK_ENROLLMENT_LIMIT),
+                      user: TokenClaims = Depends(jwt_bearer),
+                      session: AsyncSession = Depends(get_session)) -> enrollment_dto.BulkEnrollmentReport:
+    """
+    Enrolling many users at once in one transaction. Only admin access.
+
+    :param items: (user_id, course_id) pairs
+    :param user:
+    :return: result for every pair, in request order
+    """
+    return await courses_service.bulk_register_users_on_courses(user, session, items)
+
+
+@courses_router.post("/enroll/bulk/csv", response_model=enrollment_dto.BulkEnrollmentReport,
+                     status_code=status.HTTP_200_OK)
+async def bulk_enroll_csv(file: UploadFile = File(...),
+                          user: TokenClaims = Depends(jwt_bearer),
+                          session: AsyncSession = Depends(get_session)) -> enrollment_dto.BulkEnrollmentReport:
+    """
+    Same as /enroll/bulk, pairs come from a CSV file with user_id and course_id columns. Only admin access.
+
+    :param file:
+    :param user:
+    :return: result for every row, in file order
+    """
+    return await courses_service.bulk_register_users_from_csv(user, session, file)
+
+
+@courses_router.delete("/enroll", response_model=enrollment_dto.Enrollment, status_code=status.HTTP_200_OK)
+async def leave_course(course_id: int = Body(..., embed=True),
+                       user: TokenClaims = Depends(jwt_bearer),
+                       session: AsyncSession = Depends(get_session)) -> enrollment_dto.Enrollment:
+    """
+    Leaving a course. A freed seat goes to the first waitlisted enrollment.
+
+    :param course_id:
+    :param user:
+    :return: removed enrollment
+    """
+    return await courses_service.unregister_user_from_course(session, user.user_id, course_id)
+
+
+@courses_router.post("/course/{course_id}/attendance", response_model=List[attendance_dto.Attendance],
+                     status_code=status.HTTP_200_OK)
+async def record_attendance(course_id: int, roll_call: attendance_dto.RollCall,
+                            user: TokenClaims = Depends(jwt_bearer),
+                            session: AsyncSession = Depends(get_session)) -> List[attendance_dto.Attendance]:
+    """
+    Roll call for one lesson. Re-sending the same lesson overwrites previous marks. Admin and teacher access.
+
+    :param course_id:
+    :param roll_call: lesson date and (enrollment_id, is_attended) marks
+    :param user:
+    :return: stored marks
+    """
+    return await courses_service.record_attendance(user, session, course_id, roll_call)
+
+
+@courses_router.get("/course/{course_id}/attendance", response_model=List[attendance_dto.Attendance],
+                    status_code=status.HTTP_200_OK)
+async def get_attendance(course_id: int, lesson_date: date,
+                         user: TokenClaims = Depends(jwt_bearer),
+                         session: AsyncSession = Depends(get_session)) -> List[attendance_dto.Attendance]:
+    return await courses_service.get_attendance(user, session, course_id, lesson_date)
 
 
-@courses_router.post("/feedback", response_model=feedback_dto.Feedback, status_code=status.HTTP_201_CREATED,
-                     dependencies=[Depends(JWTBearer())])
+@courses_router.post("/feedback", response_model=feedback_dto.Feedback, status_code=status.HTTP_201_CREATED)
 async def submit_feedback(filter: feedback_dto.FeedbackCreate,
-                          jwt: JWTBearer = Depends(JWTBearer())) -> feedback_dto.Feedback:
-    user_id = decodeJWT(jwt).get('user_id')
-    filter.user_id = user_id
-    return await courses_service.write_feedback(filter)
+                          user: TokenClaims = Depends(jwt_bearer),
+                          session: AsyncSession = Depends(get_session)) -> feedback_dto.Feedback:
+    filter.user_id = user.user_id
+    return await courses_service.write_feedback(session, filter)
+
+
+@courses_router.get("/course/{course_id}/feedback", response_model=feedback_dto.FeedbackPage,
+                    status_code=status.HTTP_200_OK, dependencies=[Depends(jwt_bearer)])
+async def get_feedback(course_id: int, limit: int = Query(20, ge=1, le=100),
+                       after: Optional[int] = None,
+                       session: AsyncSession = Depends(get_session)) -> feedback_dto.FeedbackPage:
+    """
+    Course feedback page, ordered by id. Pass `next_after` of the previous page as `after`.
+
+    :param course_id:
+    :param limit:
+    :param after:
+    :return: page of feedback
+    """
+    page = await courses_service.get_feedback_page(session, course_id, limit, after)
+    return ORJSONResponse(page.model_dump())
@@ -0,0 +1,62 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, status, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.bearer_auth import jwt_bearer
+from src.auth.handler_auth import TokenClaims
+from src.database.database import get_session
+from src.schemas import timetable_dto, enrollment_dto, courses_dto
+from src.service import courses_service
+
+me_router = APIRouter(tags=['me'])
+
+
+@me_router.get("/me/enrollments", response_model=enrollment_dto.MyEnrollmentPage, status_code=status.HTTP_200_OK)
+async def get_my_enrollments(limit: int = Query(20, ge=1, le=100),
+                             after: Optional[int] = None,
+                             user: TokenClaims = Depends(jwt_bearer),
+                             session: AsyncSession = Depends(get_session)) -> enrollment_dto.MyEnrollmentPage:
+    """
+    Courses the user is enrolled on (registered or waitlisted), ordered by course id.
+    Pass `next_after` of the previous page as `after`.
+
+    :param limit:
+    :param after:
+    :return: page of enrollments with their courses
+    """
+    page = await courses_service.get_my_enrollments_page(session, user.user_id, limit, after)
+    return ORJSONResponse(page.model_dump())
+
+
+@me_router.get("/me/teaching", response_model=courses_dto.CoursePage, status_code=status.HTTP_200_OK)
+async def get_my_teaching(limit: int = Query(20, ge=1, le=100),
+                          after: Optional[int] = None,
+                          user: TokenClaims = Depends(jwt_bearer),
+                          session: AsyncSession = Depends(get_session)) -> courses_dto.CoursePage:
+    """
+    Courses the user teaches, ordered by id. Pass `next_after` of the previous page as `after`.
+
+    :param limit:
+    :param after:
+    :return: page of courses
+    """
+    page = await courses_service.get_teaching_page(session, user.user_id, limit, after)
+    return ORJSONResponse(page.model_dump())
+
+
+@me_router.get("/me/timetable", response_model=List[timetable_dto.TimetableEntry], status_code=status.HTTP_200_OK)
+async def get_my_timetable(date_from: date = Query(..., alias="from"),
+                           date_to: date = Query(..., alias="to"),
+                           user: TokenClaims = Depends(jwt_bearer),
+                           session: AsyncSession = Depends(get_session)) -> List[timetable_dto.TimetableEntry]:
+    """
+    Lessons of the courses the user is registered on or teaches, ordered by start time.
+
+    :param date_from: first day, inclusive
+    :param date_to: last day, inclusive
+    :return: lessons with course and the user's role in it
+    """
+    return await courses_service.get_timetable(session, user.user_id, date_from, date_to)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+
+from src.database.database import engine
+from src.monitoring import metrics
+from src.service import audit
+
+metrics_router = APIRouter(tags=['metrics'])
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, status_code=status.HTTP_200_OK,
+                    include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Request and connection pool metrics of this worker in Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(engine.sync_engine.pool, audit.writer.stats()),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,45 @@
+from typing import List
+
+from fastapi import APIRouter, status, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.bearer_auth import jwt_bearer
+from src.auth.handler_auth import TokenClaims
+from src.database.database import get_session
+from src.schemas import points_dto
+from src.service import points_service
+
+points_router = APIRouter(tags=['points'])
+
+
+@points_router.get("/me/points", response_model=points_dto.UserPoints, status_code=status.HTTP_200_OK)
+async def get_my_points(user: TokenClaims = Depends(jwt_bearer),
+                        session: AsyncSession = Depends(get_session)) -> points_dto.UserPoints:
+    return await points_service.get_user_points(session, user.user_id)
+
+
+@points_router.get("/course/{course_id}/leaderboard", response_model=List[points_dto.LeaderboardEntry],
+                   status_code=status.HTTP_200_OK, dependencies=[Depends(jwt_bearer)])
+async def get_course_leaderboard(course_id: int,
+                                 limit: int = Query(10, ge=1, le=100),
+                                 session: AsyncSession = Depends(get_session)) -> List[points_dto.LeaderboardEntry]:
+    return await points_service.get_leaderboard(session, limit, course_id)
+
+
+@points_router.get("/leaderboard", response_model=List[points_dto.LeaderboardEntry],
+                   status_code=status.HTTP_200_OK, dependencies=[Depends(jwt_bearer)])
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100),
+                          session: AsyncSession = Depends(get_session)) -> List[points_dto.LeaderboardEntry]:
+    return await points_service.get_leaderboard(session, limit)
+
+
+@points_router.post("/points/rebuild", status_code=status.HTTP_204_NO_CONTENT)
+async def rebuild_points(user: TokenClaims = Depends(jwt_bearer),
+                         session: AsyncSession = Depends(get_session)) -> None:
+    """
+    Recomputes the points ledger from raw attendance. Only admin access.
+
+    :param user:
+    :return:
+    """
+    await points_service.rebuild_points(user, session)
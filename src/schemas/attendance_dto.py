@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import List
+from datetime import date
+
+class AttendanceMark(BaseModel):
+    enrollment_id: int
+    is_attended: bool
+
+class RollCall(BaseModel):
+    lesson_date: date
+    marks: List[AttendanceMark] = Field(..., min_length=1, max_length=5000)
+
+class Attendance(AttendanceMark):
+    id: int
+    lesson_date: date
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
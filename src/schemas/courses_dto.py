@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field, ConfigDict, model_validator
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field, ConfigDict, model_validator, field_validator
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import date
 from src.database.models import models
+from src.database import lessons
 
 class CourseBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -12,6 +13,7 @@ class CourseBase(BaseModel):
     start_date: date
     end_date: date
     points_per_visit: float = Field(..., gt=0)
+    capacity: Optional[int] = Field(None, gt=0, description="Количество мест, None - без ограничений")
     teacher_ids: List[int] = Field(default_factory=list)
 
     @model_validator(mode='after')
@@ -20,8 +22,13 @@ class CourseBase(BaseModel):
             raise ValueError('end_date must be greater than start_date')
         return self
 
+def _check_schedule(schedule: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # Тот же разбор, по которому строятся занятия: иначе неверный формат молча не даёт ни одного занятия
+    lessons.parse_schedule(schedule)
+    return schedule
+
 class CourseCreate(CourseBase):
-    pass
+    check_schedule = field_validator('schedule')(_check_schedule)
 
 class CourseUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=100)
@@ -32,10 +39,22 @@ class CourseUpdate(BaseModel):
     start_date: Optional[date] = None
     end_date: Optional[date] = None
     points_per_visit: Optional[float] = Field(None, gt=0)
+    capacity: Optional[int] = Field(None, gt=0)
     teacher_ids: Optional[List[int]] = []
+    version: Optional[int] = Field(None, description="Версия курса, которую видел клиент; при расхождении - 409")
+
+    check_schedule = field_validator('schedule')(_check_schedule)
+
+def _avg_rating(rating_sum: float, rating_count: int) -> Optional[float]:
+    return rating_sum / rating_count if rating_count else None
 
 class Course(CourseBase):
     id: int
+    version: int = 1
+    enrolled_count: int = 0
+    rating_count: int = 0
+    avg_rating: Optional[float] = None
+    banner_renditions: Optional[Dict[str, str]] = None
     teachers: List[int] = Field(default_factory=list)
 
     @classmethod
@@ -46,22 +65,75 @@ class Course(CourseBase):
                 "name": obj.name,
                 "description": obj.description,
                 "banner_url": obj.banner_url,
+                "banner_renditions": obj.banner_renditions,
                 "schedule": obj.schedule,
                 "is_from_misis": obj.is_from_misis,
                 "start_date": obj.start_date,
                 "end_date": obj.end_date,
                 "points_per_visit": obj.points_per_visit,
+                "capacity": obj.capacity,
+                "enrolled_count": obj.enrolled_count,
+                "rating_count": obj.rating_count,
+                "avg_rating": _avg_rating(obj.rating_sum, obj.rating_count),
+                "version": obj.version,
                 "teacher_ids": [],
                 "teachers": [teacher.id for teacher in obj.teachers]
             }
             return cls(**data)
         else:
-            return cls(**obj)
+            data = dict(obj)
+            data["teachers"] = data.get("teachers") or []
+            if "rating_sum" in data:
+                data["avg_rating"] = _avg_rating(data["rating_sum"], data["rating_count"])
+            return cls(**data)
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Trusted construction from a course row (all columns plus aggregated `teachers`) read from the DB:
+        the data already satisfies the constraints, so validation is skipped.
+        """
+        data = dict(row)
+        data["teachers"] = data["teachers"] or []
+        # Явное значение: иначе model_construct на каждый объект разбирает сигнатуру default_factory
+        data["teacher_ids"] = []
+        data["avg_rating"] = _avg_rating(data["rating_sum"], data["rating_count"])
+        return cls.model_construct(**data)
 
     class Config:
         orm_mode = True
         from_attributes = True
 
+class CourseFilter(BaseModel):
+    limit: int = Field(20, ge=1, le=100)
+    after: Optional[int] = Field(None, description="id последнего курса предыдущей страницы")
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    is_from_misis: Optional[bool] = None
+    teacher_id: Optional[int] = None
+
+class CoursePage(BaseModel):
+    items: List[Course]
+    next_after: Optional[int] = None
+
+class CourseSearchFilter(BaseModel):
+    q: str = Field(..., min_length=1, max_length=200, description="Слова из названия или описания, опечатки допустимы")
+    limit: int = Field(20, ge=1, le=100)
+    after: Optional[str] = Field(None, pattern=r"^[0-9]+(\.[0-9]+)?([eE][+-]?[0-9]+)?:[0-9]+$",
+                                 description="next_after предыдущей страницы результатов")
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    is_from_misis: Optional[bool] = None
+    teacher_id: Optional[int] = None
+
+    def after_key(self) -> Tuple[float, int]:
+        rank, course_id = self.after.split(":")
+        return float(rank), int(course_id)
+
+class CourseSearchPage(BaseModel):
+    items: List[Course]
+    next_after: Optional[str] = None
+
 class User(BaseModel):
     id: int
 
@@ -1,6 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from enum import Enum
 from src.database.models import models
+from src.schemas.courses_dto import Course
+
+class EnrollmentStatus(str, Enum):
+    registered = "registered"
+    waitlisted = "waitlisted"
 
 class EnrollmentBase(BaseModel):
     course_id: int
@@ -16,16 +22,44 @@ class Enrollment(EnrollmentBase):
     @classmethod
     def from_attributes(cls, obj: models.EnrollmentRow):
         if isinstance(obj, models.EnrollmentRow):
-            data = {
-                "id": obj.id,
-                "course_id": obj.course_id,
-                "user_id": obj.user_id,
-                "status": obj.status
-            }
-            return cls(**data)
+            # Строка из БД, валидировать нечего
+            return cls.model_construct(
+                id=obj.id,
+                course_id=obj.course_id,
+                user_id=obj.user_id,
+                status=obj.status
+            )
         else:
             return cls(**obj)
 
     class Config:
         orm_mode = True
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BulkEnrollmentItem(BaseModel):
+    user_id: int
+    course_id: int
+
+class BulkEnrollmentResult(str, Enum):
+    registered = "registered"
+    waitlisted = "waitlisted"
+    already_enrolled = "already_enrolled"
+    duplicate = "duplicate"
+    user_not_found = "user_not_found"
+    course_not_found = "course_not_found"
+
+class BulkEnrollmentRow(BulkEnrollmentItem):
+    result: BulkEnrollmentResult
+    enrollment_id: Optional[int] = None
+
+class BulkEnrollmentReport(BaseModel):
+    rows: List[BulkEnrollmentRow] = Field(default_factory=list)
+
+class MyEnrollment(BaseModel):
+    enrollment_id: int
+    status: EnrollmentStatus
+    course: Course
+
+class MyEnrollmentPage(BaseModel):
+    items: List[MyEnrollment]
+    next_after: Optional[int] = Field(None, description="id курса последней записи страницы")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 class FeedbackBase(BaseModel):
     course_id: int
@@ -14,4 +14,8 @@ class Feedback(FeedbackBase):
 
     class Config:
         orm_mode = True
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class FeedbackPage(BaseModel):
+    items: List[Feedback]
+    next_after: Optional[int] = None
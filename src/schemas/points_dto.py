@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class CoursePoints(BaseModel):
+    course_id: int
+    visits: int
+    points: float
+
+class UserPoints(BaseModel):
+    total: float = 0
+    courses: List[CoursePoints] = Field(default_factory=list)
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    points: float
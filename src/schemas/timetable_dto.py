@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from datetime import datetime
+from enum import Enum
+
+class TimetableRole(str, Enum):
+    student = "student"
+    teacher = "teacher"
+
+class TimetableEntry(BaseModel):
+    course_id: int
+    course_name: str
+    starts_at: datetime
+    ends_at: datetime
+    role: TimetableRole
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from decouple import config
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.database import async_session, on_commit
+from src.database.models import models
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = config("AUDIT_QUEUE_SIZE", default=10000, cast=int)
+AUDIT_BATCH_SIZE = config("AUDIT_BATCH_SIZE", default=500, cast=int)
+AUDIT_FLUSH_MS = config("AUDIT_FLUSH_MS", default=200, cast=int)
+
+
+class AuditWriter:
+    """
+    Buffers audit events in a bounded queue and writes them to `logs` in the background,
+    one multi-row INSERT per AUDIT_BATCH_SIZE events or AUDIT_FLUSH_MS, whichever comes first.
+    When the queue is full new events are dropped and counted instead of slowing requests down.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._batch: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Future] = None
+
+    def record(self, user_id: int, action: str) -> None:
+        try:
+            self._queue.put_nowait({"user_id": user_id, "action": action, "timestamp": datetime.now()})
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background flush and write out everything still buffered.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._flushing is not None:
+            await self._flushing
+
+        events, self._batch = self._batch, []
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        for start in range(0, len(events), self.batch_size):
+            await self._flush(events[start:start + self.batch_size])
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch, self._batch = self._batch, []
+            # Отмена при остановке не должна оборвать уже начатую запись пачки
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: List[dict]) -> None:
+        try:
+            async with async_session() as session:
+                await session.execute(insert(models.LogRow).values(batch))
+                await session.commit()
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %d audit events", len(batch))
+
+
+writer = AuditWriter(AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_MS / 1000)
+
+
+def record(session: AsyncSession, user_id: int, action: str) -> None:
+    """
+    Audit `action` by `user_id` once the request session commits; nothing is recorded on rollback.
+    """
+    async def enqueue() -> None:
+        writer.record(user_id, action)
+
+    on_commit(session, enqueue)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from contextlib import suppress
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from decouple import config
+from fastapi.concurrency import run_in_threadpool
+
+from src.database import courses
+from src.database.database import async_session
+from src.service import save_banner
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен - баннеры отдаются только в исходном виде
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Максимальные размеры (ширина, высота), пропорции сохраняются
+RENDITIONS = {
+    "thumb": (320, 180),
+    "card": (800, 450),
+    "hero": (1920, 1080),
+}
+RENDITION_QUALITY = config("BANNER_WEBP_QUALITY", default=80, cast=int)
+BANNER_WORKERS = config("BANNER_WORKERS", default=1, cast=int)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_tasks: Set[asyncio.Task] = set()
+
+
+def rendition_path(banner_path: str, name: str) -> str:
+    root, _ = os.path.splitext(banner_path)
+    return f"{root}_{name}.webp"
+
+
+def render_renditions(banner_path: str) -> Dict[str, str]:
+    """
+    Runs in a worker process. Renditions already on disk are reused: names derive from the
+    content-hashed banner name, so identical uploads share them.
+    """
+    renditions = {name: rendition_path(banner_path, name) for name in RENDITIONS}
+    missing = {name: path for name, path in renditions.items() if not os.path.exists(path)}
+    if not missing:
+        return renditions
+
+    with Image.open(banner_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        for name, path in missing.items():
+            rendition = image.copy()
+            rendition.thumbnail(RENDITIONS[name], Image.LANCZOS)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            os.close(fd)
+            try:
+                rendition.save(tmp_path, "WEBP", quality=RENDITION_QUALITY, method=4)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+    return renditions
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # fork из многопоточного воркера может унаследовать захваченные блокировки
+        _pool = ProcessPoolExecutor(
+            max_workers=BANNER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def _process(course_id: int, banner_path: str, on_ready: Callable[[], Awaitable[None]]) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        renditions = await loop.run_in_executor(_get_pool(), render_renditions, banner_path)
+        async with async_session() as session:
+            await courses.db_lock_banner(session, banner_path)
+            await courses.db_set_banner_renditions(session, course_id, banner_path, renditions)
+            # Курс удалили или баннер заменили, пока шла обработка: collect мог отработать
+            # раньше, чем появились копии
+            if not await courses.db_banner_in_use(session, banner_path):
+                await run_in_threadpool(_remove_banner_files, banner_path)
+            await session.commit()
+        await on_ready()
+    except Exception:
+        logger.exception("Failed to build renditions for %s", banner_path)
+
+
+async def schedule(course_id: int, banner_path: str, on_ready: Callable[[], Awaitable[None]]) -> None:
+    """
+    Build renditions of a freshly stored banner in the background; the course gets them once ready,
+    then `on_ready` runs.
+    """
+    if Image is None:
+        return
+    task = asyncio.create_task(_process(course_id, banner_path, on_ready))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _remove_banner_files(banner_path: str) -> None:
+    for path in [banner_path, *(rendition_path(banner_path, name) for name in RENDITIONS)]:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+
+
+async def collect(banner_url: str) -> None:
+    """
+    Delete a replaced banner and its renditions unless another course still uses the same file
+    (uploads are deduplicated by content).
+    """
+    name = save_banner.banner_file_name(banner_url)
+    if name is None:
+        return
+    try:
+        async with async_session() as session:
+            # Блокировка держится до commit: параллельная загрузка того же файла дождётся удаления
+            # и запишет его заново
+            await courses.db_lock_banner(session, banner_url)
+            if await courses.db_banner_in_use(session, banner_url):
+                return
+            await run_in_threadpool(_remove_banner_files, os.path.join(save_banner.BANNER_DIR, name))
+            await session.commit()
+    except Exception:
+        logger.exception("Failed to collect banner %s", banner_url)
+
+
+async def shutdown() -> None:
+    global _pool
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
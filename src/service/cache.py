@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Any, Callable, Hashable, List, Optional
+
+import asyncpg
+from decouple import config
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+CACHE_BUS_RECONNECT_DELAY = config("CACHE_BUS_RECONNECT_DELAY", default=1, cast=float)
+CACHE_BUS_RECONNECT_MAX_DELAY = config("CACHE_BUS_RECONNECT_MAX_DELAY", default=30, cast=float)
+# Как часто проверять LISTEN-соединение: обрыв без закрытия сокета иначе не заметить
+CACHE_BUS_HEALTHCHECK_INTERVAL = config("CACHE_BUS_HEALTHCHECK_INTERVAL", default=30, cast=float)
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire after `ttl` seconds.
+    Not thread-safe: meant for a single event loop per worker.
+
+    `generation` changes on every pop/clear. A caller that builds a value from the database reads
+    it before the query and passes it to `set`, so a value read before a concurrent invalidation
+    is not stored after it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at >= time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._items[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self.generation += 1
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class LocalInvalidationBus:
+    """
+    Delivers invalidation messages to subscribers of this worker only.
+    """
+
+    def __init__(self):
+        self._handlers: List[Callable[[str], None]] = []
+        self._reset_handlers: List[Callable[[], None]] = []
+
+    def subscribe(self, handler: Callable[[str], None]) -> None:
+        self._handlers.append(handler)
+
+    def subscribe_reset(self, handler: Callable[[], None]) -> None:
+        """
+        `handler` runs when messages may have been lost and everything cached should be dropped.
+        """
+        self._reset_handlers.append(handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, message: str) -> None:
+        self._deliver(message)
+
+    def _deliver(self, message: str) -> None:
+        for handler in self._handlers:
+            handler(message)
+
+    def _reset(self) -> None:
+        for handler in self._reset_handlers:
+            handler()
+
+
+class PostgresInvalidationBus(LocalInvalidationBus):
+    """
+    Broadcasts invalidation messages to every worker through Postgres LISTEN/NOTIFY.
+    Each worker listens on `channel` over its own connection, outside the engine's pool, and
+    re-establishes it when it is lost. Notifications sent meanwhile are missed, so subscribers are
+    reset every time listening (re)starts.
+    """
+
+    def __init__(self, engine: AsyncEngine, channel: str):
+        super().__init__()
+        self._engine = engine
+        self._channel = channel
+        # URL движка без драйвера SQLAlchemy и его параметров - для прямого подключения asyncpg
+        self._dsn = engine.url.set(drivername="postgresql", query={}).render_as_string(hide_password=False)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _listen(self) -> None:
+        delay = CACHE_BUS_RECONNECT_DELAY
+        while True:
+            try:
+                connection = await asyncpg.connect(self._dsn)
+            except Exception as e:
+                logger.warning("Cannot connect to listen on %r, retrying in %.1fs: %s", self._channel, delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CACHE_BUS_RECONNECT_MAX_DELAY)
+                continue
+
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(self._channel, self._on_notify)
+                logger.info("Listening for cache invalidations on %r", self._channel)
+                delay = CACHE_BUS_RECONNECT_DELAY
+                self._reset()
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), CACHE_BUS_HEALTHCHECK_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await connection.fetchval("SELECT 1", timeout=CACHE_BUS_HEALTHCHECK_INTERVAL)
+                logger.warning("Lost the connection listening on %r, reconnecting", self._channel)
+            except Exception:
+                logger.warning("Lost the connection listening on %r, reconnecting", self._channel, exc_info=True)
+            finally:
+                connection.terminate()
+
+    async def publish(self, message: str) -> None:
+        # Локально чистим сразу, остальные воркеры получат NOTIFY (этот воркер - тоже, повторно)
+        self._deliver(message)
+        try:
+            async with self._engine.begin() as connection:
+                await connection.execute(select(func.pg_notify(self._channel, message)))
+        except Exception:
+            logger.exception("Failed to publish cache invalidation %r", message)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        self._deliver(payload)
@@ -1,123 +1,372 @@
 from sqlalchemy import Sequence
-from src.database import courses, users
-from typing import List
-from src.schemas import courses_dto, enrollment_dto, feedback_dto
-from src.database.database import async_session
+from src.database import courses, users, attendance, lessons
+from typing import List, AsyncIterator, Optional, Tuple
+from datetime import date, datetime, time, timedelta
+from src.schemas import courses_dto, enrollment_dto, feedback_dto, attendance_dto, timetable_dto
+from src.schemas.export_dto import ExportFormat
+from src.service import export, banner_renditions, audit, save_banner
+from src.service.cache import TTLCache, LocalInvalidationBus, PostgresInvalidationBus
+from src.database.database import engine, on_commit, on_rollback
+from decouple import config
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import UploadFile, HTTPException
 from src.database.models import models
 from functools import wraps
+from src.auth.handler_auth import TokenClaims
+import csv
+import hashlib
+import io
+
+BULK_ENROLLMENT_LIMIT = 10000
+TIMETABLE_MAX_DAYS = 92
+
+CATALOG_CACHE_SIZE = config("CATALOG_CACHE_SIZE", default=1024, cast=int)
+CATALOG_CACHE_TTL = config("CATALOG_CACHE_TTL", default=30, cast=float)
+# local - только текущий воркер, postgres - рассылка через LISTEN/NOTIFY на все воркеры.
+# С local и несколькими воркерами правки из соседних воркеров видны через CATALOG_CACHE_TTL
+CATALOG_CACHE_BUS = config("CATALOG_CACHE_BUS", default="local")
+
+course_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+page_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+if CATALOG_CACHE_BUS == "postgres":
+    cache_bus = PostgresInvalidationBus(engine, "catalog_cache")
+else:
+    cache_bus = LocalInvalidationBus()
+
+
+def _invalidate_catalog(course_id: str) -> None:
+    # Любое изменение курса может сдвинуть любую страницу каталога
+    course_cache.pop(int(course_id))
+    page_cache.clear()
+
+
+def _reset_catalog() -> None:
+    course_cache.clear()
+    page_cache.clear()
+
+
+cache_bus.subscribe(_invalidate_catalog)
+cache_bus.subscribe_reset(_reset_catalog)
+
+
+def invalidate_course(session: AsyncSession, course_id: int) -> None:
+    """
+    Drop the course and all catalog pages from every worker's cache once the request commits.
+    """
+    on_commit(session, lambda: cache_bus.publish(str(course_id)))
+
+
+def cache_stats() -> dict:
+    return {"courses": course_cache.stats(), "pages": page_cache.stats()}
 
 
 def admin_access(func):
     @wraps(func)
-    async def wrapper(role: str, *args, **kwargs):
-        if role != "admin":
+    async def wrapper(user: TokenClaims, *args, **kwargs):
+        if user.role != "admin":
             raise HTTPException(403, "Forbidden")
-        return await func(role, *args, **kwargs)
+        return await func(user, *args, **kwargs)
 
     return wrapper
 
 def teacher_admin_access(func):
     @wraps(func)
-    async def wrapper(role: str, *args, **kwargs):
-        if role != "admin" and role != "teacher":
+    async def wrapper(user: TokenClaims, *args, **kwargs):
+        if user.role != "admin" and user.role != "teacher":
             raise HTTPException(403, "Forbidden")
-        return await func(role, *args, **kwargs)
+        return await func(user, *args, **kwargs)
 
     return wrapper
 
 @admin_access
-async def create_course(role, course: courses_dto.CourseCreate) -> courses_dto.Course:
-    async with async_session() as session:
-        teachers = await users.get_users_by_ids(session, course.teacher_ids)
-        course = models.CourseRow(
-            name=course.name,
-            description=course.description,
-            banner_url=course.banner_url,
-            schedule=course.schedule,
-            is_from_misis=course.is_from_misis,
-            start_date=course.start_date,
-            end_date=course.end_date,
-            points_per_visit=course.points_per_visit,
-        )
-        course.teachers.extend(teachers)
-        course = await courses.db_create_course(session, course)
-        return courses_dto.Course.from_attributes(course)
+async def create_course(user: TokenClaims, session: AsyncSession,
+                        course: courses_dto.CourseCreate) -> courses_dto.Course:
+    teachers = await users.get_users_by_ids(session, course.teacher_ids)
+    course = models.CourseRow(
+        name=course.name,
+        description=course.description,
+        banner_url=course.banner_url,
+        schedule=course.schedule,
+        is_from_misis=course.is_from_misis,
+        start_date=course.start_date,
+        end_date=course.end_date,
+        points_per_visit=course.points_per_visit,
+        capacity=course.capacity,
+    )
+    course.teachers.extend(teachers)
+    course = await courses.db_create_course(session, course)
+    invalidate_course(session, course.id)
+    audit.record(session, user.user_id, f"course.create:{course.id}")
+    return courses_dto.Course.from_attributes(course)
 
 
 @teacher_admin_access
-async def update_banner(role: str, course_id: int, file: UploadFile) -> courses_dto.Course:
-    async with async_session() as session:
-        course = await courses.db_update_course_banner(session, course_id, file)
-        return courses_dto.Course.from_attributes(course)
+async def update_banner(user: TokenClaims, session: AsyncSession,
+                        course_id: int, file: UploadFile) -> courses_dto.Course:
+    # Файл пишется до UPDATE: сначала убеждаемся, что курс есть, а при откате убираем
+    # уже не нужный файл
+    await courses.db_lock_course(session, course_id)
+    banner_url = await save_banner.save_banner_to_storage(session, file)
+    on_rollback(session, lambda: banner_renditions.collect(banner_url))
+    course = await courses.db_update_course_banner(session, course_id, banner_url)
+    invalidate_course(session, course_id)
+    audit.record(session, user.user_id, f"course.banner:{course_id}")
+    # Копии появляются в курсе позже, отдельной транзакцией - кэш сбрасывается ещё раз
+    on_commit(session, lambda: banner_renditions.schedule(
+        course_id, course["banner_url"], lambda: cache_bus.publish(str(course_id))
+    ))
+    previous = course["previous_banner_url"]
+    if previous and previous != course["banner_url"]:
+        on_commit(session, lambda: banner_renditions.collect(previous))
+    return courses_dto.Course.from_row(course)
 
 
 @teacher_admin_access
-async def update_schedule(role: str, course_id: int, filter: courses_dto.CourseUpdate) -> courses_dto.Course:
-    async with async_session() as session:
-        course = await courses.db_update_course_schedule(session, course_id, filter.schedule)
-        return courses_dto.Course.from_attributes(course)
+async def update_schedule(user: TokenClaims, session: AsyncSession,
+                          course_id: int, filter: courses_dto.CourseUpdate) -> courses_dto.Course:
+    course = await courses.db_update_course_schedule(session, course_id, filter.schedule)
+    invalidate_course(session, course_id)
+    audit.record(session, user.user_id, f"course.schedule:{course_id}")
+    return courses_dto.Course.from_row(course)
 
 
 @admin_access
-async def delete_course(role: str, course_id: int) -> courses_dto.Course:
-    async with async_session() as session:
-        course = await courses.db_delete_course(session, course_id)
-        return courses_dto.Course.from_attributes(course)
+async def delete_course(user: TokenClaims, session: AsyncSession, course_id: int) -> courses_dto.Course:
+    course = await courses.db_delete_course(session, course_id)
+    invalidate_course(session, course_id)
+    audit.record(session, user.user_id, f"course.delete:{course_id}")
+    if course["banner_url"]:
+        on_commit(session, lambda: banner_renditions.collect(course["banner_url"]))
+    return courses_dto.Course.from_row(course)
 
 
 @teacher_admin_access
-async def update_course(role: str, course_id: int, filter: courses_dto.CourseUpdate):
-    async with async_session() as session:
-        course = await courses.db_update_course_info(session, course_id, filter)
-        return courses_dto.Course.from_attributes(course)
+async def update_course(user: TokenClaims, session: AsyncSession, course_id: int, filter: courses_dto.CourseUpdate):
+    course = await courses.db_update_course_info(session, course_id, filter)
+    invalidate_course(session, course_id)
+    audit.record(session, user.user_id, f"course.update:{course_id}")
+    return courses_dto.Course.from_row(course)
 
 
 @teacher_admin_access
-async def get_all_users_in_course(role: str, course_id: int):
-    async with async_session() as session:
-        return await courses.db_get_enrolled_users(session, course_id)
+async def get_all_users_in_course(user: TokenClaims, session: AsyncSession, course_id: int):
+    return await courses.db_get_enrolled_users(session, course_id)
 
 
 async def add_course_teachers(
-        role: str,
-        current_user_id: int,
+        user: TokenClaims,
+        session: AsyncSession,
         course_id: int,
         teacher_ids: List[int]
 ) -> courses_dto.Course:
-    async with async_session() as session:
-        course = await courses.get_course_by_id(session, course_id)
-        if not course:
-            raise HTTPException(status_code=404, detail="Курс не найден")
+    existing_teachers = await users.get_users_by_ids(session, teacher_ids)
+    if len(existing_teachers) != len(teacher_ids):
+        raise HTTPException(status_code=404, detail="Один или несколько преподавателей не найдены")
+
+    await courses.db_add_course_teachers(session, course_id, teacher_ids)
+    invalidate_course(session, course_id)
+    audit.record(session, user.user_id, f"course.teachers:{course_id}")
 
-        existing_teachers = await users.get_users_by_ids(session, teacher_ids)
-        if len(existing_teachers) != len(teacher_ids):
-            raise HTTPException(status_code=404, detail="Один или несколько преподавателей не найдены")
+    updated_course = await courses.db_get_course(session, course_id)
+    return courses_dto.Course.from_row(updated_course)
 
-        await courses.db_add_course_teachers(session, course_id, teacher_ids)
 
-        updated_course = await courses.get_full_course(session, course_id)
-        return courses_dto.Course.from_attributes(updated_course)
+def _course_state(course: courses_dto.Course, separator: str) -> str:
+    # Всё, от чего зависит ответ: version меняют правки курса, счётчики - записи и отзывы
+    return separator.join(map(str, (course.id, course.version, course.enrolled_count, course.rating_count)))
 
 
-async def get_all_courses() -> Sequence[courses_dto.Course]:
-    async with async_session() as session:
-        courses_list = await courses.db_get_all_courses(session)
-        return [courses_dto.Course.from_attributes(course) for course in courses_list]
+async def get_course(session: AsyncSession, course_id: int) -> Tuple[str, courses_dto.Course]:
+    """
+    ETag and DTO of a course. Served from the cache until a write to the course publishes
+    an invalidation; only a miss queries the database.
+    """
+    cached = course_cache.get(course_id)
+    if cached is not None:
+        return cached
+
+    generation = course_cache.generation
+    course = courses_dto.Course.from_row(await courses.db_get_course(session, course_id))
+    entry = (_course_state(course, "-"), course)
+    course_cache.set(course_id, entry, generation)
+    return entry
+
+
+async def get_courses_page(session: AsyncSession,
+                           filter: courses_dto.CourseFilter) -> Tuple[str, courses_dto.CoursePage]:
+    """
+    ETag and catalog page, cached the same way as get_course.
+    """
+    key = tuple(filter.model_dump().items())
+    cached = page_cache.get(key)
+    if cached is not None:
+        return cached
+
+    generation = page_cache.generation
+    rows = await courses.db_get_courses_page(session, filter)
+
+    items = [courses_dto.Course.from_row(row) for row in rows]
+    next_after = items[-1].id if len(items) == filter.limit else None
+    page = courses_dto.CoursePage(items=items, next_after=next_after)
+    etag = hashlib.md5(",".join(_course_state(course, ":") for course in items).encode()).hexdigest()
+    entry = (etag, page)
+    page_cache.set(key, entry, generation)
+    return entry
+
+
+async def search_courses(session: AsyncSession,
+                         filter: courses_dto.CourseSearchFilter) -> courses_dto.CourseSearchPage:
+    rows = await courses.db_search_courses(session, filter)
+
+    items = [courses_dto.Course.from_row(row) for row in rows]
+    next_after = f"{rows[-1]['rank']!r}:{rows[-1]['id']}" if len(rows) == filter.limit else None
+    return courses_dto.CourseSearchPage(items=items, next_after=next_after)
+
+
+@admin_access
+async def get_cache_stats(user: TokenClaims) -> dict:
+    return cache_stats()
+
+
+@admin_access
+async def export_courses(user: TokenClaims, fmt: ExportFormat) -> AsyncIterator[str]:
+    return export.stream_rows(fmt, export.COURSE_FIELDS, courses.db_stream_courses)
+
+
+@teacher_admin_access
+async def export_enrolled_users(user: TokenClaims, course_id: int, fmt: ExportFormat) -> AsyncIterator[str]:
+    return export.stream_rows(
+        fmt, export.ENROLLED_USER_FIELDS,
+        lambda session: courses.db_stream_enrolled_users(session, course_id)
+    )
+
+
+async def register_user_on_course(session: AsyncSession,
+                                  filter: enrollment_dto.EnrollmentCreate) -> enrollment_dto.Enrollment:
+    try:
+        clash = await lessons.db_find_clash(session, filter.user_id, filter.course_id)
+        if clash is not None:
+            raise HTTPException(status_code=409, detail=f"Занятия пересекаются с курсом «{clash}»")
+        enrollment = await courses.db_register_user_on_course(session, filter)
+        if enrollment.status == enrollment_dto.EnrollmentStatus.registered.value:
+            invalidate_course(session, filter.course_id)
+        audit.record(session, filter.user_id, f"enrollment.create:{filter.course_id}")
+        return enrollment_dto.Enrollment.from_attributes(enrollment)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при регистрации на курс: {str(e)}")
+
+
+@admin_access
+async def bulk_register_users_on_courses(
+        user: TokenClaims,
+        session: AsyncSession,
+        items: List[enrollment_dto.BulkEnrollmentItem]
+) -> enrollment_dto.BulkEnrollmentReport:
+    rows = await courses.db_bulk_register_users_on_courses(session, items)
+    registered = enrollment_dto.BulkEnrollmentResult.registered
+    for course_id in {row.course_id for row in rows if row.result == registered}:
+        invalidate_course(session, course_id)
+    audit.record(session, user.user_id, f"enrollment.bulk:{len(items)}")
+    return enrollment_dto.BulkEnrollmentReport(rows=rows)
+
+
+@admin_access
+async def bulk_register_users_from_csv(user: TokenClaims, session: AsyncSession,
+                                       file: UploadFile) -> enrollment_dto.BulkEnrollmentReport:
+    content = await file.read()
+    try:
+        rows = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        items = [
+            enrollment_dto.BulkEnrollmentItem(user_id=row["user_id"], course_id=row["course_id"])
+            for row in rows
+        ]
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="CSV должен содержать колонки user_id и course_id с числами")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="CSV не содержит записей")
+    if len(items) > BULK_ENROLLMENT_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Не больше {BULK_ENROLLMENT_LIMIT} записей за раз")
+    return await bulk_register_users_on_courses(user, session, items)
+
+
+async def unregister_user_from_course(session: AsyncSession, user_id: int, course_id: int) -> enrollment_dto.Enrollment:
+    enrollment = await courses.db_unregister_user_from_course(session, user_id, course_id)
+    # Место либо освобождается, либо переходит записи из листа ожидания - курс меняется в обоих случаях
+    invalidate_course(session, course_id)
+    audit.record(session, user_id, f"enrollment.delete:{course_id}")
+    return enrollment_dto.Enrollment.from_attributes(enrollment)
+
+
+async def get_my_enrollments_page(session: AsyncSession, user_id: int, limit: int,
+                                  after: Optional[int] = None) -> enrollment_dto.MyEnrollmentPage:
+    rows = await courses.db_get_user_enrollments_page(session, user_id, limit, after)
+
+    items = [
+        enrollment_dto.MyEnrollment.model_construct(
+            enrollment_id=row["enrollment_id"],
+            status=enrollment_dto.EnrollmentStatus(row["status"]),
+            course=courses_dto.Course.from_row(row)
+        )
+        for row in rows
+    ]
+    next_after = rows[-1]["id"] if len(rows) == limit else None
+    return enrollment_dto.MyEnrollmentPage(items=items, next_after=next_after)
+
+
+async def get_teaching_page(session: AsyncSession, teacher_id: int, limit: int,
+                            after: Optional[int] = None) -> courses_dto.CoursePage:
+    rows = await courses.db_get_teaching_page(session, teacher_id, limit, after)
+
+    items = [courses_dto.Course.from_row(row) for row in rows]
+    next_after = items[-1].id if len(items) == limit else None
+    return courses_dto.CoursePage(items=items, next_after=next_after)
+
+
+async def get_timetable(session: AsyncSession, user_id: int,
+                        date_from: date, date_to: date) -> List[timetable_dto.TimetableEntry]:
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="Дата окончания раньше даты начала")
+    if (date_to - date_from).days >= TIMETABLE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Период не больше {TIMETABLE_MAX_DAYS} дней")
+
+    rows = await lessons.db_get_timetable(
+        session, user_id,
+        datetime.combine(date_from, time.min),
+        datetime.combine(date_to + timedelta(days=1), time.min)
+    )
+    return [timetable_dto.TimetableEntry.model_validate(dict(row)) for row in rows]
+
+
+@teacher_admin_access
+async def record_attendance(user: TokenClaims, session: AsyncSession, course_id: int,
+                            roll_call: attendance_dto.RollCall) -> List[attendance_dto.Attendance]:
+    rows = await attendance.db_record_attendance(session, course_id, roll_call)
+    audit.record(session, user.user_id, f"attendance.record:{course_id}")
+    return [attendance_dto.Attendance.model_validate(dict(row)) for row in rows]
+
+
+@teacher_admin_access
+async def get_attendance(user: TokenClaims, session: AsyncSession,
+                         course_id: int, lesson_date: date) -> List[attendance_dto.Attendance]:
+    rows = await attendance.db_get_attendance(session, course_id, lesson_date)
+    return [attendance_dto.Attendance.model_validate(dict(row)) for row in rows]
+
 
+async def write_feedback(session: AsyncSession, filter: feedback_dto.FeedbackCreate) -> feedback_dto.Feedback:
+    feedback = await courses.db_write_feedback(session, filter)
+    invalidate_course(session, filter.course_id)
+    audit.record(session, filter.user_id, f"feedback.create:{filter.course_id}")
+    return feedback_dto.Feedback.model_validate(feedback)
 
-async def register_user_on_course(filter: enrollment_dto.EnrollmentCreate) -> enrollment_dto.Enrollment:
-    async with async_session() as session:
-        try:
-            enrollment = await courses.db_register_user_on_course(session, filter)
-            return enrollment_dto.Enrollment.from_attributes(enrollment)
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Ошибка при регистрации на курс: {str(e)}")
 
+async def get_feedback_page(session: AsyncSession,
+                            course_id: int, limit: int, after: Optional[int] = None) -> feedback_dto.FeedbackPage:
+    rows = await courses.db_get_feedback_page(session, course_id, limit, after)
 
-async def write_feedback(filter: feedback_dto.FeedbackCreate) -> feedback_dto.Feedback:
-    async with async_session() as session:
-        course = await courses.db_write_feedback(session, filter)
-        return feedback_dto.Feedback.from_attributes(course)
+    items = [feedback_dto.Feedback.model_validate(row) for row in rows]
+    next_after = items[-1].id if len(items) == limit else None
+    return feedback_dto.FeedbackPage(items=items, next_after=next_after)
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable, List
+
+from sqlalchemy import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.database import async_session
+from src.schemas.export_dto import ExportFormat
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+COURSE_FIELDS = ["id", "name", "description", "banner_url", "schedule", "is_from_misis",
+                 "start_date", "end_date", "points_per_visit", "capacity", "enrolled_count",
+                 "rating_count", "rating_sum", "teachers"]
+ENROLLED_USER_FIELDS = ["enrollment_id", "id", "email", "role", "status"]
+
+
+def _ndjson_line(row: dict) -> str:
+    return json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([_csv_value(value) for value in values])
+    return buffer.getvalue()
+
+
+async def stream_rows(fmt: ExportFormat, fields: List[str],
+                      rows: Callable[[AsyncSession], AsyncIterator[RowMapping]]) -> AsyncIterator[str]:
+    """
+    Serializes rows one by one as they come from the server-side cursor.
+    The session lives as long as the response body is being sent.
+    """
+    if fmt == ExportFormat.csv:
+        yield _csv_line(fields)
+
+    async with async_session() as session:
+        async for row in rows(session):
+            if fmt == ExportFormat.csv:
+                yield _csv_line([row[field] for field in fields])
+            else:
+                yield _ndjson_line({field: row[field] for field in fields})
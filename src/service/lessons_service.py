@@ -0,0 +1,30 @@
+import asyncio
+import logging
+
+from src.database import lessons
+from src.database.database import async_session
+
+logger = logging.getLogger(__name__)
+
+
+async def _rebuild_lessons() -> None:
+    async with async_session() as session:
+        courses = await lessons.db_get_course_schedules(session)
+        skipped = 0
+        for course in courses:
+            try:
+                await lessons.db_rebuild_lessons(
+                    session, course["id"], course["schedule"], course["start_date"], course["end_date"]
+                )
+            except ValueError as e:
+                # Расписание сохранено до проверки формата: курс остаётся без занятий, пока его не исправят
+                logger.warning("Course %s: %s", course["id"], e)
+                skipped += 1
+        await session.commit()
+    logger.info("Lessons rebuilt for %d courses, %d skipped", len(courses) - skipped, skipped)
+
+
+if __name__ == "__main__":
+    # python -m src.service.lessons_service - занятия для курсов, созданных до появления таблицы lesson
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_rebuild_lessons())
@@ -1,7 +1,17 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from src.database import login
-from src.database.database import async_session
+from src.service import audit
+
+
+async def user_login(session: AsyncSession, uid: int) -> list:
+    user = await login.user_login(session, uid)
+    if user:
+        audit.record(session, user[0], "login")
+    return user
 
 
-async def user_login(uid: int) -> list:
-    async with async_session() as session:
-        return await login.user_login(session, uid)
+async def create_user(session: AsyncSession, id: int, email: str, role: str) -> dict:
+    new_user = await login.db_create_user(session, id, email, role)
+    audit.record(session, new_user.id, "register")
+    return {"id": new_user.id, "email": new_user.email, "role": new_user.role}
@@ -0,0 +1,39 @@
+import asyncio
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.handler_auth import TokenClaims
+from src.database import points
+from src.database.database import async_session
+from src.schemas import points_dto
+from src.service.courses_service import admin_access
+
+
+async def get_user_points(session: AsyncSession, user_id: int) -> points_dto.UserPoints:
+    rows = await points.db_get_user_points(session, user_id)
+
+    courses = [points_dto.CoursePoints(**row) for row in rows]
+    return points_dto.UserPoints(total=sum(course.points for course in courses), courses=courses)
+
+
+async def get_leaderboard(session: AsyncSession, limit: int,
+                          course_id: Optional[int] = None) -> List[points_dto.LeaderboardEntry]:
+    rows = await points.db_get_leaderboard(session, limit, course_id)
+    return [points_dto.LeaderboardEntry(**row) for row in rows]
+
+
+@admin_access
+async def rebuild_points(user: TokenClaims, session: AsyncSession) -> None:
+    await points.db_rebuild_points(session)
+
+
+async def _rebuild_points() -> None:
+    async with async_session() as session:
+        await points.db_rebuild_points(session)
+        await session.commit()
+
+
+if __name__ == "__main__":
+    # python -m src.service.points_service - пересчёт баллов из сырых отметок посещаемости
+    asyncio.run(_rebuild_points())
@@ -1,16 +1,147 @@
+import hashlib
 import os
-from fastapi import UploadFile
-from datetime import datetime
+import re
+import tempfile
+from contextlib import suppress
+from typing import Optional
 
+from decouple import config
+from fastapi import UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
 
-async def save_banner_to_storage(file: UploadFile, course_id: int) -> str:
-    file_extension = file.filename.split('.')[-1]
-    filename = f"course_{course_id}_banner_{datetime.now().strftime('%Y%m%d%H%M%S')}.{file_extension}"
+from src.database import courses
 
-    file_path = os.path.join("banners", filename)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+BANNER_DIR = "banners"
+BANNER_MAX_SIZE = config("BANNER_MAX_SIZE", default=5 * 1024 * 1024, cast=int)
+CHUNK_SIZE = 64 * 1024
+BANNER_UPLOAD_PATH_RE = re.compile(r"/course/[0-9]+/banner")
+# Граница и заголовки части multipart поверх самого файла
+MULTIPART_OVERHEAD = 16 * 1024
 
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+# Имена, которые выдаёт хранилище: sha256 содержимого и, для копий, суффикс размера
+HASHED_BANNER_RE = re.compile(r"[0-9a-f]{64}(_[a-z]+)?\.(png|jpg|gif|webp)")
+# Любой баннер в каталоге, включая старые course_<id>_banner_<время>.<ext>
+BANNER_NAME_RE = re.compile(r"[A-Za-z0-9_]+\.(png|jpg|jpeg|gif|webp)")
+
+# Тип определяется по первым байтам файла, content_type и расширение от клиента не проверяются
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+def detect_image_type(head: bytes) -> Optional[str]:
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def banner_file_name(banner_url: str) -> Optional[str]:
+    """
+    Name of the file inside BANNER_DIR that `banner_url` points to, or None for anything else
+    (banner_url can also be set by hand through the course update).
+    """
+    directory, name = os.path.split(os.path.normpath(banner_url))
+    if directory != BANNER_DIR or not BANNER_NAME_RE.fullmatch(name):
+        return None
+    return name
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Размер баннера не должен превышать {BANNER_MAX_SIZE} байт"
+    )
+
+
+class BannerUploadLimitMiddleware:
+    """
+    Rejects oversized banner uploads before Starlette spools the multipart body to disk:
+    by Content-Length up front, and by counting the raw body for chunked requests.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "PUT"
+                or not BANNER_UPLOAD_PATH_RE.fullmatch(scope["path"])):
+            await self.app(scope, receive, send)
+            return
+
+        limit = BANNER_MAX_SIZE + MULTIPART_OVERHEAD
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            error = _too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI пробрасывает HTTPException из чтения тела как есть, а не как ошибку разбора
+                    raise _too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _remove_quietly(path: str) -> None:
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+async def save_banner_to_storage(session: AsyncSession, file: UploadFile) -> str:
+    """
+    Store the upload under its content hash. The banner lock taken here is held until the
+    request transaction ends, so a concurrent collect cannot delete the file before the course
+    references it.
+    """
+    chunk = await file.read(CHUNK_SIZE)
+    file_extension = detect_image_type(chunk)
+    if file_extension is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл должен быть изображением")
+
+    os.makedirs(BANNER_DIR, exist_ok=True)
+    # Пишем во временный файл в том же каталоге, чтобы os.replace был атомарным
+    fd, tmp_path = await run_in_threadpool(tempfile.mkstemp, dir=BANNER_DIR, suffix=".part")
+    try:
+        digest = hashlib.sha256()
+        tmp = await run_in_threadpool(os.fdopen, fd, "wb")
+        try:
+            size = 0
+            while chunk:
+                size += len(chunk)
+                if size > BANNER_MAX_SIZE:
+                    raise _too_large()
+                digest.update(chunk)
+                await run_in_threadpool(tmp.write, chunk)
+                chunk = await file.read(CHUNK_SIZE)
+        finally:
+            await run_in_threadpool(tmp.close)
+
+        # Имя - хэш содержимого: повторная загрузка того же файла не создаёт копию
+        file_path = os.path.join(BANNER_DIR, f"{digest.hexdigest()}.{file_extension}")
+        await courses.db_lock_banner(session, file_path)
+        if await run_in_threadpool(os.path.exists, file_path):
+            await run_in_threadpool(_remove_quietly, tmp_path)
+        else:
+            await run_in_threadpool(os.replace, tmp_path, file_path)
+    except BaseException:
+        await run_in_threadpool(_remove_quietly, tmp_path)
+        raise
     return file_path
@@ -0,0 +1,82 @@
+"""
+Plans of the paged "my courses" queries. Runs against the database configured through DB_*
+(env or .env) and is skipped when none is configured. Everything happens inside one transaction
+that is rolled back, so the schema and data of that database are left untouched.
+"""
+import asyncio
+import json
+
+import pytest
+from decouple import config
+
+if not all(config(name, default=None) for name in ("DB_USERNAME", "DB_PASSWORD", "DB_NAME", "DB_HOST")):
+    pytest.skip("DB_USERNAME, DB_PASSWORD, DB_NAME and DB_HOST are not configured", allow_module_level=True)
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.database import courses
+from src.database.database import DATABASE_URL
+from src.database.models.models import Base
+
+
+def _index_scans(plan: dict):
+    if plan["Node Type"] in ("Index Scan", "Index Only Scan"):
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from _index_scans(child)
+
+
+async def _explain(query) -> set:
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with engine.connect() as conn:
+            transaction = await conn.begin()
+            try:
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                await conn.run_sync(Base.metadata.create_all)
+                # На пустых таблицах планировщик предпочёл бы seq scan; проверяем, что индекс
+                # подходит запросу, а не оценку стоимости
+                await conn.execute(text("SET LOCAL enable_seqscan = off"))
+                await conn.execute(text("SET LOCAL enable_bitmapscan = off"))
+
+                session = AsyncSession(bind=conn)
+                statements.clear()
+                await query(session)
+                statement, parameters = statements[-1]
+
+                result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                plan = result.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return set(_index_scans(plan[0]["Plan"]))
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+
+
+def test_user_enrollments_page_uses_user_course_index():
+    indexes = asyncio.run(_explain(
+        lambda session: courses.db_get_user_enrollments_page(session, user_id=1, limit=20, after=10)
+    ))
+    assert "uq_enrollment_user_course" in indexes
+
+
+def test_teaching_page_uses_teacher_course_index():
+    indexes = asyncio.run(_explain(
+        lambda session: courses.db_get_teaching_page(session, teacher_id=1, limit=20, after=10)
+    ))
+    assert "ix_course_teachers_teacher_id_course_id" in indexes
+
+
+def test_enrolled_users_uses_course_user_index():
+    indexes = asyncio.run(_explain(lambda session: courses.db_get_enrolled_users(session, course_id=1)))
+    assert "ix_enrollment_course_id_user_id" in indexes